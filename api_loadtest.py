@@ -0,0 +1,81 @@
+# Load test for api_server.py: N concurrent clients posting single-row predictions
+#
+#   python api_server.py --port 8000 &
+#   python api_loadtest.py --url http://127.0.0.1:8000 --clients 32 --requests 200
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+from sleep_model import POTENTIAL_FEATURES, generate_synthetic_data
+
+
+def run_client(host, port, payloads, latencies, errors):
+    conn = http.client.HTTPConnection(host, port)
+    headers = {'Content-Type': 'application/json'}
+    for payload in payloads:
+        start = time.perf_counter()
+        try:
+            conn.request('POST', '/predict', payload, headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except OSError as e:
+            errors.append(str(e))
+            conn.close()
+            conn = http.client.HTTPConnection(host, port)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure /predict throughput and latency.")
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--clients', type=int, default=32, help="Concurrent connections")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per client")
+    args = parser.parse_args(argv)
+
+    url = urlparse(args.url)
+    # The API takes source category values: map the generator's codes through
+    # the served model's schema
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80)
+    conn.request('GET', '/health')
+    categories = json.loads(conn.getresponse().read())['categories']
+    conn.close()
+    rows = generate_synthetic_data(args.clients * args.requests, seed=7)[POTENTIAL_FEATURES].astype(float)
+    for col, values in categories.items():
+        rows[col] = np.asarray(values, dtype=object)[rows[col].astype(int)]
+    payloads = [json.dumps(record) for record in rows.to_dict(orient='records')]
+
+    latencies, errors = [], []
+    threads = []
+    for i in range(args.clients):
+        chunk = payloads[i * args.requests:(i + 1) * args.requests]
+        threads.append(threading.Thread(target=run_client,
+                                        args=(url.hostname, url.port or 80, chunk, latencies, errors)))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    ms = np.array(latencies) * 1000
+    print(f"{len(latencies)} ok, {len(errors)} errors in {elapsed:.2f}s "
+          f"with {args.clients} clients -> {len(latencies) / elapsed:,.0f} req/s")
+    if len(ms):
+        print(f"latency ms: p50 {np.percentile(ms, 50):.2f}  p95 {np.percentile(ms, 95):.2f}  "
+              f"p99 {np.percentile(ms, 99):.2f}  max {ms.max():.2f}")
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
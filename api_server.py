@@ -0,0 +1,156 @@
+# JSON prediction API next to the Streamlit UI
+#
+#   python api_server.py --port 8000
+#
+#   POST /predict  {"Gender": 0, "Age": 21, "Academic Level": 2, ...}   -> one prediction
+#   POST /predict  {"instances": [{"Gender": 0, ...}, ...]}             -> one per instance
+#   GET  /health                                     -> model key, accuracy, features and categories
+#   GET  /metrics                                    -> batching and cache statistics
+#   GET  /metrics/prometheus                         -> same plus stage histograms, as text
+#
+# Like batch files, instances carry the training spreadsheet's source values
+# (e.g. Academic Level 1-4, as listed under "categories" by /health) and are
+# encoded with the model's schema. Every feature must be present and non-null;
+# unknown categories, missing or null features get a 400.
+#
+# Concurrent requests are coalesced by batching.MicroBatcher: rows that arrive
+# within a few milliseconds of each other are scored in one predict_proba call.
+import argparse
+import asyncio
+import contextlib
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from sleep_model import DATA_PATH, load_latest_artifact, load_or_train_model
+from inference import FastPredictor
+from batch_predict import COLUMN_ALIASES, encode_features
+from batching import MAX_BATCH_SIZE, MAX_WAIT_MS, RESULT_TIMEOUT_SECONDS, MicroBatcher
+from prediction_cache import PredictionCache
+from telemetry import SPANS
+
+
+def create_app(artifact, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+    predictor = FastPredictor.from_artifact(artifact)
+    batcher = MicroBatcher(predictor.predict_proba, max_batch_size, max_wait_ms)
+    cache = PredictionCache()
+    model_version = artifact['key']
+    classes = [str(c) for c in predictor.classes_]
+    encoder = artifact['encoder']
+
+    # Model input rows for JSON instances, encoded like batch_predict's inputs
+    def to_rows(instances):
+        df = pd.DataFrame.from_records(instances).rename(columns=COLUMN_ALIASES)
+        missing = [col for col in predictor.feature_cols if col not in df.columns or df[col].isna().any()]
+        if missing:
+            raise ValueError(f"Missing or null features: {', '.join(missing)}")
+        df = encode_features(df, predictor.feature_cols, encoder=encoder)
+        return df[predictor.feature_cols].to_numpy(dtype=np.float64)
+
+    def to_result(proba):
+        return {
+            'prediction': classes[int(proba.argmax())],
+            'probabilities': dict(zip(classes, proba.tolist())),
+        }
+
+    async def predict(request):
+        start = time.perf_counter()
+        try:
+            body = await request.json()
+        except ValueError:
+            return JSONResponse({'error': 'Request body must be JSON'}, status_code=400)
+        if not isinstance(body, dict):
+            return JSONResponse({'error': 'Request body must be a JSON object'}, status_code=400)
+
+        is_batch = 'instances' in body
+        instances = body['instances'] if is_batch else [body]
+        if not isinstance(instances, list) or not all(isinstance(inst, dict) for inst in instances):
+            return JSONResponse({'error': "'instances' must be a list of objects"}, status_code=400)
+        if not instances:
+            return JSONResponse({'predictions': []})
+        try:
+            rows = to_rows(instances)
+        except (ValueError, TypeError) as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+
+        # Serve repeated feature vectors from the cache; only misses reach the model
+        proba = np.empty((len(rows), len(classes)))
+        missing = []
+        for i, row in enumerate(rows):
+            cached = cache.get(row, model_version)
+            if cached is None:
+                missing.append(i)
+            else:
+                proba[i] = cached
+        if missing:
+            try:
+                proba[missing] = await asyncio.wait_for(asyncio.wrap_future(batcher.submit(rows[missing])),
+                                                        RESULT_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                return JSONResponse({'error': 'Prediction timed out'}, status_code=503)
+            for i in missing:
+                cache.put(rows[i], model_version, proba[i].copy())
+        SPANS.record_since('api.predict', start, rows=len(rows), cache_misses=len(missing))
+        if is_batch:
+            return JSONResponse({'predictions': [to_result(p) for p in proba]})
+        return JSONResponse(to_result(proba[0]))
+
+    async def health(request):
+        return JSONResponse({
+            'status': 'ok',
+            'model_key': artifact['key'],
+            'accuracy': artifact['metrics']['accuracy'],
+            'features': predictor.feature_cols,
+            'categories': encoder.to_dict(),
+            'classes': classes,
+        })
+
+    async def metrics(request):
+        return JSONResponse({'batching': batcher.metrics.snapshot(), 'cache': cache.stats()})
+
+    async def prometheus_metrics(request):
+        text = SPANS.prometheus_text(model_version=model_version, cache=cache.stats(),
+                                     batching=batcher.metrics.snapshot())
+        return PlainTextResponse(text, media_type='text/plain; version=0.0.4')
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        yield
+        batcher.close()
+
+    return Starlette(
+        routes=[
+            Route('/predict', predict, methods=['POST']),
+            Route('/health', health, methods=['GET']),
+            Route('/metrics', metrics, methods=['GET']),
+            Route('/metrics/prometheus', prometheus_metrics, methods=['GET']),
+        ],
+        lifespan=lifespan,
+    )
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve sleep disorder predictions over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch-size', type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS)
+    args = parser.parse_args(argv)
+
+    if os.environ.get('SLEEP_SERVE_ONLY') == '1':
+        artifact = load_latest_artifact()
+    else:
+        artifact = load_or_train_model(DATA_PATH)
+    app = create_app(artifact, args.max_batch_size, args.max_wait_ms)
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+# Batch scoring: predict a whole spreadsheet of students in one vectorized pass
+#
+#   python batch_predict.py scoring_cross_data_new.xlsx -o predictions.csv
+#
+# Files too large for memory are streamed in fixed-size chunks instead:
+#
+#   python batch_predict.py campus_export.csv -o predictions.parquet --chunksize 100000
+#
+# Categorical columns carry the same source values as the training spreadsheet
+# (e.g. Academic Level 1-4) and are encoded with the schema saved in the model
+# artifact. Each row also gets the lifestyle risk score and tier (risk.py).
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from inference import standardize, weigh
+from risk import RISK_COLUMNS, RISK_SCORE_COL, RISK_TIER_COL, score_frame, tier_labels
+from sleep_model import DATA_PATH, N_JOBS, load_or_train_model, with_n_jobs
+
+# Alternative column names seen in exported cohort files
+COLUMN_ALIASES = {
+    'Heart Rate': 'Heart Rate (bpm)',
+}
+
+PREDICTION_COL = 'Predicted Sleep Disorder'
+
+# Rows per chunk when streaming
+DEFAULT_CHUNKSIZE = 50000
+
+
+# Read CSV, Parquet or Excel based on the file name. Values are returned as
+# they are in the file; encode_features maps them to model codes. Scoring
+# inputs are usually one-off, so Excel files are read directly rather than
+# through the data cache.
+def read_table(source, name=None):
+    name = (name or str(source)).lower()
+    if name.endswith('.csv'):
+        return pd.read_csv(source)
+    if name.endswith('.parquet'):
+        return pd.read_parquet(source)
+    return pd.read_excel(source)
+
+
+# Input frame with model column names and codes. Columns the file lacks can be
+# filled with a constant through `defaults`; categorical columns are mapped to
+# model codes by `encoder` (an encoding.CategoryEncoder).
+def encode_features(df, feature_cols, defaults=None, encoder=None):
+    df = df.rename(columns=COLUMN_ALIASES)
+    if defaults:
+        df = df.assign(**{col: value for col, value in defaults.items() if col not in df.columns})
+    if encoder is not None:
+        df = encoder.transform(df)
+    missing = [col for col in feature_cols if col not in df.columns]
+    if missing:
+        raise ValueError(f"Input is missing required columns: {', '.join(missing)}")
+    return df
+
+
+# Weighted, standardized feature matrix in training column order, from a frame
+# already passed through encode_features
+def prepare_features(encoded, feature_cols, feature_weights, scaler):
+    # Same float32 weighting and scaling as training, as whole-matrix ops
+    X = weigh(encoded[feature_cols].to_numpy(), np.sqrt([feature_weights.get(col, 1.0) for col in feature_cols]))
+    return standardize(X, scaler.mean_, scaler.scale_, out=X)
+
+
+# Class probabilities and labels for every row, from a single predict_proba call
+# spread over `n_jobs` threads (trees are scored in parallel), plus the risk
+# score and tier when the input has their columns
+def predict_batch(df, rf_model, scaler, feature_cols, feature_weights, defaults=None, n_jobs=None,
+                  encoder=None):
+    encoded = encode_features(df, feature_cols, defaults, encoder)
+    X = prepare_features(encoded, feature_cols, feature_weights, scaler)
+    proba = with_n_jobs(rf_model, n_jobs).predict_proba(X)
+    labels = rf_model.classes_[proba.argmax(axis=1)]
+
+    results = df.copy()
+    results[PREDICTION_COL] = labels
+    for i, cls in enumerate(rf_model.classes_):
+        results[f'Probability {cls}'] = proba[:, i]
+    if all(col in encoded.columns for col in RISK_COLUMNS):
+        scores, tiers = score_frame(encoded)
+        results[RISK_SCORE_COL] = scores
+        results[RISK_TIER_COL] = tier_labels(tiers)
+    return results
+
+
+# Yield DataFrames of at most `chunksize` rows without loading the whole file
+def iter_table_chunks(path, chunksize=DEFAULT_CHUNKSIZE):
+    name = str(path).lower()
+    if name.endswith('.csv'):
+        yield from pd.read_csv(path, chunksize=chunksize)
+    elif name.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        # openpyxl's read-only mode streams rows instead of building the whole workbook
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            buffer = []
+            for row in rows:
+                buffer.append(row)
+                if len(buffer) >= chunksize:
+                    yield pd.DataFrame(buffer, columns=header)
+                    buffer = []
+            if buffer:
+                yield pd.DataFrame(buffer, columns=header)
+        finally:
+            workbook.close()
+
+
+# Parquet schema every streamed chunk is cast to, from the first scored chunk.
+# Later chunks may infer other types for the same input column (an int column
+# that gets a NaN becomes float, an all-null column gets values), so integer
+# columns are widened to float64 and columns with no values yet are typed as
+# strings.
+def _streaming_schema(table, results):
+    import pyarrow as pa
+
+    empty = set(results.columns[results.isna().all()])
+    fields = []
+    for field in table.schema:
+        if field.name in empty or pa.types.is_null(field.type):
+            field = field.with_type(pa.string())
+        elif pa.types.is_integer(field.type):
+            field = field.with_type(pa.float64())
+        fields.append(field)
+    return pa.schema(fields)
+
+
+# Score `path` chunk by chunk and append each scored chunk to `output`
+# (CSV or Parquet), so memory stays bounded by the chunk size. The output is
+# written under a temporary name and renamed into place once complete, so a
+# failing chunk never leaves a truncated file behind.
+def score_file_streaming(path, output, rf_model, scaler, feature_cols, feature_weights,
+                         defaults=None, chunksize=DEFAULT_CHUNKSIZE, n_jobs=None, encoder=None):
+    n_rows = 0
+    counts = {}
+    writer = None
+    tmp_output = f'{output}.tmp-{os.getpid()}'
+    try:
+        for chunk in iter_table_chunks(path, chunksize):
+            results = predict_batch(chunk, rf_model, scaler, feature_cols, feature_weights, defaults, n_jobs,
+                                    encoder)
+            if str(output).lower().endswith('.parquet'):
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                table = pa.Table.from_pandas(results, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_output, _streaming_schema(table, results))
+                try:
+                    table = table.cast(writer.schema)
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError, ValueError) as e:
+                    raise ValueError(f"Rows {n_rows + 1}-{n_rows + len(results)} do not match the column "
+                                     f"types of the first chunk: {e}") from e
+                writer.write_table(table)
+            else:
+                results.to_csv(tmp_output, mode='w' if n_rows == 0 else 'a', header=n_rows == 0, index=False)
+            n_rows += len(results)
+            for label, count in results[PREDICTION_COL].value_counts().items():
+                counts[label] = counts.get(label, 0) + int(count)
+        if writer is not None:
+            writer.close()
+            writer = None
+        if n_rows:
+            os.replace(tmp_output, output)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_output):
+            os.remove(tmp_output)
+    return n_rows, counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a spreadsheet of students with the trained model.")
+    parser.add_argument('input', help="CSV, Parquet or Excel file to score")
+    parser.add_argument('-o', '--output', default=None,
+                        help="Output CSV, or Parquet when streaming (default: <input>_predictions.csv)")
+    parser.add_argument('--data', default=DATA_PATH, help="Training spreadsheet the model was built from")
+    parser.add_argument('--default', action='append', default=[], metavar='COLUMN=VALUE',
+                        help="Constant for a feature the input lacks, e.g. --default 'Academic Level=1'")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="Stream the input in chunks of this many rows instead of loading it whole")
+    parser.add_argument('--n-jobs', type=int, default=N_JOBS,
+                        help="Threads for scoring (-1 = all cores, default: $SLEEP_N_JOBS or -1)")
+    args = parser.parse_args(argv)
+
+    defaults = {}
+    for item in args.default:
+        col, _, value = item.partition('=')
+        if not value:
+            parser.error(f"--default expects COLUMN=VALUE, got '{item}'")
+        defaults[col.strip()] = float(value)
+
+    artifact = load_or_train_model(args.data)
+    output = args.output or os.path.splitext(args.input)[0] + '_predictions.csv'
+
+    # Missing columns and unknown category values are input errors, not crashes
+    if args.chunksize:
+        start = time.perf_counter()
+        try:
+            n_rows, counts = score_file_streaming(args.input, output, artifact['model'], artifact['scaler'],
+                                                  artifact['feature_cols'], artifact['feature_weights'],
+                                                  defaults, args.chunksize, args.n_jobs, artifact['encoder'])
+        except ValueError as e:
+            parser.error(str(e))
+        elapsed = time.perf_counter() - start
+        print(f"Scored {n_rows} rows in {elapsed:.3f}s -> {output}")
+        for label, count in sorted(counts.items(), key=lambda item: -item[1]):
+            print(f"{label}  {count}")
+        return 0
+
+    df = read_table(args.input)
+
+    start = time.perf_counter()
+    try:
+        results = predict_batch(df, artifact['model'], artifact['scaler'],
+                                artifact['feature_cols'], artifact['feature_weights'], defaults, args.n_jobs,
+                                artifact['encoder'])
+    except ValueError as e:
+        parser.error(str(e))
+    elapsed = time.perf_counter() - start
+
+    results.to_csv(output, index=False)
+    print(f"Scored {len(results)} rows in {elapsed:.3f}s -> {output}")
+    print(results[PREDICTION_COL].value_counts().to_string())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+# Micro-batching scheduler: coalesces concurrent single-row predictions into one
+# vectorized predict_proba call
+#
+# Streamlit sessions and API requests run on different threads; each calls
+# `submit` (or the blocking `predict_proba`) and a background worker scores
+# everything that arrived within `max_wait_ms` of the first queued row, or as
+# soon as `max_batch_size` rows are waiting. A blocking call that finds nothing
+# queued or in flight is scored directly on the caller's thread: a lone request
+# has nothing to coalesce with and would only wait out the window. A request
+# that cannot be scored (wrong width, predict_fn error) fails on its own
+# Future; the worker keeps running and the rest of its batch is still answered.
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+# Default coalescing window and batch cap
+MAX_BATCH_SIZE = 256
+MAX_WAIT_MS = 2.0
+
+# Samples kept for percentile metrics
+METRICS_WINDOW = 10000
+
+# Seconds the blocking predict_proba waits for its result
+RESULT_TIMEOUT_SECONDS = 10.0
+
+
+# Rolling batch size / queue wait / end-to-end latency statistics
+class BatchMetrics:
+    def __init__(self, window=METRICS_WINDOW):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.rows = 0
+        self.errors = 0
+        self.batch_sizes = collections.deque(maxlen=window)
+        self.queue_wait_ms = collections.deque(maxlen=window)
+        self.latency_ms = collections.deque(maxlen=window)
+
+    def record(self, batch_rows, queue_waits, latencies, errors=0):
+        with self._lock:
+            self.batches += 1
+            self.requests += len(latencies)
+            self.rows += batch_rows
+            self.errors += errors
+            self.batch_sizes.append(batch_rows)
+            self.queue_wait_ms.extend(queue_waits)
+            self.latency_ms.extend(latencies)
+
+    @staticmethod
+    def _summary(samples):
+        if not samples:
+            return {'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+        values = np.fromiter(samples, dtype=np.float64)
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        return {'mean': float(values.mean()), 'p50': float(p50), 'p95': float(p95),
+                'p99': float(p99), 'max': float(values.max())}
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'requests': self.requests,
+                'rows': self.rows,
+                'errors': self.errors,
+                'batch_size': self._summary(self.batch_sizes),
+                'queue_wait_ms': self._summary(self.queue_wait_ms),
+                'latency_ms': self._summary(self.latency_ms),
+            }
+
+
+# Fail a request's Future unless it was already resolved or cancelled;
+# returns 1 if it was failed here
+def _fail(future, error):
+    if future.done():
+        return 0
+    future.set_exception(error)
+    return 1
+
+
+class MicroBatcher:
+    def __init__(self, predict_fn, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.metrics = BatchMetrics()
+        self._queue = queue.Queue()
+        self._closed = False
+        # Requests queued or being scored (queued ones until their Future resolves)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._worker.start()
+
+    # Queue a (n, n_features) matrix; the Future resolves to its probability rows
+    def submit(self, rows):
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        rows = np.atleast_2d(np.asarray(rows, dtype=np.float64))
+        future = Future()
+        with self._lock:
+            self._active += 1
+        future.add_done_callback(self._release)
+        self._queue.put((rows, future, time.perf_counter()))
+        return future
+
+    def _release(self, future=None):
+        with self._lock:
+            self._active -= 1
+
+    def predict_proba(self, rows, timeout=RESULT_TIMEOUT_SECONDS):
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        with self._lock:
+            idle = self._active == 0
+            if idle:
+                self._active += 1
+        if not idle:
+            return self.submit(rows).result(timeout)
+        rows = np.atleast_2d(np.asarray(rows, dtype=np.float64))
+        start = time.perf_counter()
+        try:
+            proba = self.predict_fn(rows)
+        except Exception:
+            self.metrics.record(len(rows), [0.0], [(time.perf_counter() - start) * 1000], errors=1)
+            raise
+        finally:
+            self._release()
+        self.metrics.record(len(rows), [0.0], [(time.perf_counter() - start) * 1000])
+        return proba
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        pending = [first]
+        n_rows = len(first[0])
+        deadline = first[2] + self.max_wait
+        while n_rows < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                if timeout > 0:
+                    item = self._queue.get(timeout=timeout)
+                else:
+                    # Window is over, but rows that already queued up still join
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Finish this batch, then stop
+                self._queue.put(None)
+                break
+            pending.append(item)
+            n_rows += len(item[0])
+        return pending
+
+    # Score requests of one feature width together and resolve their Futures
+    def _score(self, pending):
+        proba = self.predict_fn(np.concatenate([rows for rows, _, _ in pending]))
+        if len(proba) != sum(len(rows) for rows, _, _ in pending):
+            raise ValueError(f"predict_fn returned {len(proba)} rows for {len(pending)} requests")
+        start = 0
+        for rows, future, _ in pending:
+            if not future.done():
+                future.set_result(proba[start:start + len(rows)])
+            start += len(rows)
+
+    # Score a batch; when it fails as a whole, retry its requests one by one so
+    # only the offending ones get the exception. Returns the number that failed.
+    def _process(self, pending):
+        groups = collections.defaultdict(list)
+        for item in pending:
+            groups[item[0].shape[1:]].append(item)
+        errors = 0
+        for group in groups.values():
+            try:
+                self._score(group)
+                continue
+            except Exception as e:
+                if len(group) == 1:
+                    errors += _fail(group[0][1], e)
+                    continue
+            for item in group:
+                try:
+                    self._score([item])
+                except Exception as e:
+                    errors += _fail(item[1], e)
+        return errors
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            if pending is None:
+                return
+            started = time.perf_counter()
+            try:
+                errors = self._process(pending)
+            except Exception as e:
+                # Never leave a caller waiting, whatever went wrong
+                errors = sum(_fail(future, e) for _, future, _ in pending)
+            finished = time.perf_counter()
+            self.metrics.record(
+                sum(len(rows) for rows, _, _ in pending),
+                [(started - enqueued) * 1000 for _, _, enqueued in pending],
+                [(finished - enqueued) * 1000 for _, _, enqueued in pending],
+                errors,
+            )
@@ -0,0 +1,68 @@
+# Parallel scaling benchmark: forest fit and batch scoring time for 1..N workers
+#
+#   python bench_parallel.py --train-rows 50000 --score-rows 500000
+#
+# Runs offline on the synthetic generator; prints a table and optionally writes JSON.
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from sleep_model import FEATURE_WEIGHTS, MODEL_PARAMS, POTENTIAL_FEATURES, generate_synthetic_data, with_n_jobs
+
+
+def worker_counts(max_workers):
+    counts = []
+    n = 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    counts.append(max_workers)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure RandomForest fit/score scaling across cores.")
+    parser.add_argument('--train-rows', type=int, default=20000)
+    parser.add_argument('--score-rows', type=int, default=200000)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', default=None, help="Write results as JSON")
+    args = parser.parse_args(argv)
+
+    weights = np.sqrt([FEATURE_WEIGHTS[col] for col in POTENTIAL_FEATURES])
+    train = generate_synthetic_data(args.train_rows, seed=1)
+    X_train = train[POTENTIAL_FEATURES].to_numpy(dtype=np.float64) * weights
+    y_train = train['Sleep Disorder'].to_numpy()
+    X_score = generate_synthetic_data(args.score_rows, seed=2)[POTENTIAL_FEATURES].to_numpy(dtype=np.float64) * weights
+
+    results = []
+    print(f"{'workers':>7} {'fit s':>8} {'speedup':>8} {'score s':>8} {'speedup':>8} {'rows/s':>12}")
+    for n_jobs in worker_counts(args.max_workers):
+        model = RandomForestClassifier(**dict(MODEL_PARAMS, n_jobs=n_jobs))
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with_n_jobs(model, n_jobs).predict_proba(X_score)
+        score_seconds = time.perf_counter() - start
+
+        results.append({'n_jobs': n_jobs, 'fit_seconds': fit_seconds, 'score_seconds': score_seconds})
+        base = results[0]
+        print(f"{n_jobs:>7} {fit_seconds:>8.2f} {base['fit_seconds'] / fit_seconds:>7.2f}x "
+              f"{score_seconds:>8.2f} {base['score_seconds'] / score_seconds:>7.2f}x "
+              f"{args.score_rows / score_seconds:>12,.0f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'train_rows': args.train_rows, 'score_rows': args.score_rows,
+                       'cpu_count': os.cpu_count(), 'results': results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+# Cold-start benchmark: import time and resident memory of a fresh serving worker
+#
+#   python train.py && python bench_startup.py --runs 5
+#
+# Every run is a new interpreter, so nothing is shared through sys.modules.
+# 'serve' boots the way a SLEEP_SERVE_ONLY worker does (app imports, load the
+# published artifact, score one row); 'eager' additionally imports the
+# training and plotting libraries the app used to load at the top, as a
+# reference for what the lazy imports save.
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# Modules that must not be imported on the serve-only path (sklearn.model_selection
+# is not listed: unpickling the forest imports it through sklearn.ensemble)
+TRAINING_MODULES = ['imblearn', 'matplotlib', 'seaborn', 'plotly.express']
+
+MODES = ['serve', 'eager']
+
+
+def boot_worker(mode, model_dir):
+    start = time.perf_counter()
+    if mode == 'eager':
+        import matplotlib.pyplot  # noqa: F401
+        import seaborn  # noqa: F401
+        import plotly.express  # noqa: F401
+        from sklearn.model_selection import train_test_split  # noqa: F401
+        from imblearn.over_sampling import SMOTE  # noqa: F401
+    import streamlit  # noqa: F401
+    import pandas  # noqa: F401
+    from sleep_model import load_latest_artifact
+    import batch_predict  # noqa: F401
+    import batching  # noqa: F401
+    import prediction_cache  # noqa: F401
+    from model_reload import ModelHandle
+    imported = time.perf_counter()
+
+    handle = ModelHandle(load_latest_artifact(model_dir), model_dir, reload_seconds=0)
+    predictor = handle.current().predictor
+    predictor.predict_proba(np.zeros((1, len(predictor.feature_cols))))
+    ready = time.perf_counter()
+
+    return {
+        'import_seconds': imported - start,
+        'ready_seconds': ready - start,
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'training_modules': [name for name in TRAINING_MODULES if name in sys.modules],
+    }
+
+
+def run_cold(mode, model_dir):
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, __file__, '--child', mode, '--model-dir', model_dir],
+                         check=True, capture_output=True, text=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result['process_seconds'] = time.perf_counter() - start
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure serving worker cold-start time and memory.")
+    parser.add_argument('--runs', type=int, default=3, help="Fresh processes per mode")
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    # Not sleep_model.MODEL_DIR: importing it here would happen outside the timed window
+    parser.add_argument('--model-dir', default=os.environ.get('SLEEP_MODEL_DIR', 'models'))
+    parser.add_argument('--output', default=None, help="Write results as JSON")
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(boot_worker(args.child, args.model_dir)))
+        return 0
+
+    if not os.path.exists(os.path.join(args.model_dir, 'LATEST')):
+        print(f"No trained model in '{args.model_dir}'. Run `python train.py` first.")
+        return 1
+
+    results = {}
+    print(f"{'mode':>6} {'process s':>10} {'import s':>9} {'ready s':>8} {'rss MB':>7}  training modules")
+    for mode in args.modes:
+        runs = [run_cold(mode, args.model_dir) for _ in range(args.runs)]
+        summary = {name: float(np.median([run[name] for run in runs]))
+                   for name in ('process_seconds', 'import_seconds', 'ready_seconds', 'max_rss_mb')}
+        summary['training_modules'] = runs[0]['training_modules']
+        results[mode] = {'median': summary, 'runs': runs}
+        print(f"{mode:>6} {summary['process_seconds']:>10.2f} {summary['import_seconds']:>9.2f} "
+              f"{summary['ready_seconds']:>8.2f} {summary['max_rss_mb']:>7.0f}  "
+              f"{', '.join(summary['training_modules']) or '-'}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'runs': args.runs, 'python': sys.version.split()[0], 'results': results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
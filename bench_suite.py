@@ -0,0 +1,443 @@
+# Benchmark suite for the data, training and prediction paths
+#
+#   python bench_suite.py --output bench-$(git rev-parse --short HEAD).json
+#   python bench_suite.py --quick --compare bench-abc1234.json
+#
+# Runs offline: the model and every input come from the synthetic generator.
+# The Excel cases only run when the training spreadsheet is present. Each case
+# reports its median wall time over --repeats runs plus the peak memory it
+# allocated (tracemalloc, which numpy reports its buffers to); --compare prints
+# the ratio against an earlier results file.
+import argparse
+import json
+import os
+import pickle
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+from sleep_model import (DATA_PATH, N_JOBS, evaluation_summary, generate_synthetic_data, load_artifact,
+                         save_artifact, train_model, weighted_features)
+from data_cache import load_table, read_arrow, write_arrow
+from encoding import CategoryEncoder
+from batch_predict import predict_batch
+from batching import MicroBatcher
+from imbalance import IMBALANCE_STRATEGIES, resample
+from inference import FastPredictor
+from prediction_cache import PredictionCache
+from risk import risk_scores, risk_tiers, score_frame
+
+LOAD_ROWS = [1000, 100000, 1000000]
+TRAIN_ROWS = [500, 5000]
+TRAIN_MEMORY_ROWS = [100000, 1000000]
+
+# Small forest for the training-memory cases: they measure the data pipeline
+# (weighting, split, resampling, scaling), not tree growth
+TRAIN_MEMORY_PARAMS = {'n_estimators': 4, 'max_depth': 8}
+IMBALANCE_ROWS = [10000, 100000, 1000000]
+
+# Training rows of the models whose worker memory the serving_memory cases
+# compare (default MODEL_PARAMS, as train.py ships)
+SERVING_MEMORY_ROWS = [5000, 100000]
+
+# Forest for the imbalance cases: small enough for 1M rows, large enough for
+# macro-F1 to tell the strategies apart
+IMBALANCE_PARAMS = {'n_estimators': 25, 'max_depth': 12}
+BATCH_ROWS = [1000, 100000, 1000000]
+RISK_ROWS = [1000, 100000, 1000000]
+QUICK_ROWS = [1000, 100000]
+
+# Rows the benchmark model is trained on
+MODEL_ROWS = 5000
+
+# Iterations for the single-row latency cases
+SINGLE_ROW_ITERATIONS = 2000
+
+
+def run_timed(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def peak_memory_mb(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1e6
+
+
+def measure(name, fn, repeats, rows=None, memory=True, **params):
+    if rows:
+        params['rows'] = rows
+    samples = run_timed(fn, repeats)
+    result = {'case': name, 'params': params, 'seconds': float(np.median(samples)),
+              'min_seconds': float(np.min(samples))}
+    if rows:
+        result['rows'] = rows
+        result['rows_per_second'] = rows / result['seconds']
+    if memory:
+        result['peak_mb'] = peak_memory_mb(fn)
+    return result
+
+
+# Per-call latency percentiles for a single-row function
+def measure_latency(name, fn, iterations, **params):
+    fn()
+    samples = np.array(run_timed(fn, iterations)) * 1000
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {'case': name, 'params': params, 'seconds': float(np.median(samples)) / 1000,
+            'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99)}
+
+
+def load_cases(rows, repeats):
+    results = []
+    if os.path.exists(DATA_PATH):
+        results.append(measure('load_excel_openpyxl', lambda: pd.read_excel(DATA_PATH), repeats, path=DATA_PATH))
+        with tempfile.TemporaryDirectory() as cache_dir:
+            load_table(DATA_PATH, cache_dir=cache_dir)
+            results.append(measure('load_excel_cached', lambda: load_table(DATA_PATH, cache_dir=cache_dir),
+                                   repeats, path=DATA_PATH))
+    for n in rows:
+        results.append(measure('load_synthetic', lambda: generate_synthetic_data(n), repeats, rows=n))
+    return results
+
+
+def train_cases(rows, repeats, n_jobs):
+    results = []
+    for n in rows:
+        df = generate_synthetic_data(n)
+        runs = []
+        for _ in range(repeats):
+            timings = {}
+            train_model(df, {'n_jobs': n_jobs}, timings)
+            runs.append(timings)
+        stages = {stage: float(np.median([run[stage] for run in runs])) for stage in runs[0]}
+        results.append({'case': 'train_model', 'params': {'rows': n, 'n_jobs': n_jobs},
+                        'seconds': sum(stages.values()), 'stages': stages,
+                        'peak_mb': peak_memory_mb(lambda: train_model(df, {'n_jobs': n_jobs}))})
+    return results
+
+
+# Peak RSS of train_model in a fresh process, over a memory-mapped input frame
+# (as load_table provides it). `rss_growth_mb` is the high-water mark reached
+# during training minus the one before it.
+def train_memory_child(arrow_path, n_jobs):
+    df = read_arrow(arrow_path)
+    before = process_peak_rss_mb()
+    train_model(df, dict(TRAIN_MEMORY_PARAMS, n_jobs=n_jobs))
+    peak = process_peak_rss_mb()
+    return {'peak_rss_mb': peak, 'rss_growth_mb': peak - before}
+
+
+def train_memory_cases(rows, n_jobs):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n in rows:
+            arrow_path = os.path.join(tmp_dir, f'train-{n}.arrow')
+            write_arrow(generate_synthetic_data(n), arrow_path)
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), '--train-memory-child', arrow_path,
+                                  '--n-jobs', str(n_jobs)], capture_output=True, text=True, check=True)
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            results.append({'case': 'train_model_memory', 'params': {'rows': n, 'n_jobs': n_jobs},
+                            'seconds': time.perf_counter() - start, **result})
+    return results
+
+
+# Each class-imbalance strategy on the same data: resample and fit time,
+# the resampling step's peak memory and held-out macro-F1
+def imbalance_cases(rows, n_jobs, strategies=IMBALANCE_STRATEGIES):
+    from sklearn.metrics import f1_score
+
+    results = []
+    for n in rows:
+        df = generate_synthetic_data(n)
+        X, _ = weighted_features(df)
+        y = df['Sleep Disorder'].astype(str).to_numpy()
+        for strategy in strategies:
+            timings = {}
+            trained = train_model(df, dict(IMBALANCE_PARAMS, n_jobs=n_jobs), timings, strategy)
+            results.append({'case': 'train_imbalance', 'params': {'rows': n, 'strategy': strategy},
+                            'seconds': sum(timings.values()),
+                            'stages': {stage: timings[stage] for stage in ('resample', 'fit')},
+                            'peak_mb': peak_memory_mb(lambda: resample(X, y, strategy, n_jobs)),
+                            'macro_f1': float(f1_score(trained[4], trained[5], average='macro'))})
+    return results
+
+
+def single_row_cases(model, iterations):
+    rf_model, scaler, feature_cols, feature_weights = model
+    predictor = FastPredictor(rf_model, scaler, feature_cols, feature_weights)
+    row = generate_synthetic_data(1, seed=3)[feature_cols].to_numpy(dtype=np.float64)
+    weighted_row = row * np.sqrt([feature_weights[col] for col in feature_cols])
+
+    batcher = MicroBatcher(predictor.predict_proba)
+    cache = PredictionCache()
+    try:
+        results = [
+            measure_latency('predict_one_sklearn',
+                            lambda: rf_model.predict_proba(scaler.transform(weighted_row)), iterations),
+            measure_latency('predict_one_fast', lambda: predictor.predict_proba(row), iterations),
+            measure_latency('predict_one_batcher', lambda: batcher.predict_proba(row), iterations),
+            measure_latency('predict_one_cache_hit',
+                            lambda: cache.get_or_compute(row[0], 'bench', lambda: predictor.predict_proba(row)[0]),
+                            iterations),
+        ]
+    finally:
+        batcher.close()
+    return results
+
+
+def batch_cases(model, rows, repeats, n_jobs):
+    rf_model, scaler, feature_cols, feature_weights = model
+    predictor = FastPredictor(rf_model, scaler, feature_cols, feature_weights)
+    results = []
+    for n in rows:
+        df = generate_synthetic_data(n, seed=2)[feature_cols]
+        X = df.to_numpy(dtype=np.float64)
+        results.append(measure('predict_batch', lambda: predict_batch(df, rf_model, scaler, feature_cols,
+                                                                      feature_weights, n_jobs=n_jobs),
+                               repeats, rows=n, n_jobs=n_jobs))
+        results.append(measure('fast_predict_proba', lambda: predictor.predict_proba(X), repeats, rows=n))
+    return results
+
+
+# Risk score and tier for a whole encoded frame, and for the single form input
+def risk_cases(rows, repeats, iterations):
+    results = []
+    for n in rows:
+        df = generate_synthetic_data(n, seed=4)
+        results.append(measure('risk_score_frame', lambda: score_frame(df), repeats, rows=n))
+    results.append(measure_latency('risk_score_one', lambda: risk_tiers(risk_scores(5, 7, 45, 2, 7.5), 2),
+                                   iterations))
+    return results
+
+
+# Per-rerun cost of handing the model to a Streamlit rerun. st.cache_data
+# returns an unpickled copy of its value on every call (the old app cached the
+# whole train_model tuple that way); st.cache_resource returns the shared
+# object itself, so its per-rerun cost is a dict lookup.
+def cache_cases(trained, repeats):
+    rf_model, scaler, feature_cols = trained[:3]
+    bundles = [
+        ('rerun_copy_train_tuple', pickle.dumps(trained)),
+        ('rerun_copy_serving_bundle', pickle.dumps({'model': rf_model, 'scaler': scaler,
+                                                    'feature_cols': feature_cols, 'feature_weights': trained[9]})),
+    ]
+    return [measure(name, lambda: pickle.loads(payload), repeats, payload_mb=round(len(payload) / 1e6, 2))
+            for name, payload in bundles]
+
+
+# Resident memory a fresh worker adds by loading what it serves: the serving
+# artifact the app keeps today (memory-mapped joblib + compiled forest, behind a
+# FastPredictor), or the old combined bundle (train_model's tuple with the
+# training/test matrices, plus the evaluation) that st.cache_data held. `anon`
+# is private memory; file-backed pages of the memory-mapped artifact are shared
+# by all workers through the page cache.
+def serving_memory_child(kind, path):
+    # Both bundles need these; importing them first leaves only the data measured
+    import sklearn.ensemble  # noqa: F401
+    import sklearn.preprocessing  # noqa: F401
+
+    before = process_memory_mb()
+    if kind == 'serving':
+        artifact = load_artifact(os.path.basename(path), os.path.dirname(path))
+        held = FastPredictor.from_artifact(artifact)
+        held.predict_proba(np.zeros((1, len(held.feature_cols))))
+    else:
+        with open(path, 'rb') as f:
+            held = pickle.load(f)
+    after = process_memory_mb()
+    return {'rss_mb': after['rss'], 'rss_growth_mb': after['rss'] - before['rss'],
+            'anon_growth_mb': after['anon'] - before['anon']}
+
+
+def serving_memory_cases(rows, n_jobs):
+    results = []
+    with tempfile.TemporaryDirectory() as model_dir:
+        for n in rows:
+            df = generate_synthetic_data(n)
+            trained = train_model(df, {'n_jobs': n_jobs})
+            rf_model, scaler, feature_cols, _, y_test, y_pred = trained[:6]
+            rf_model.set_params(n_jobs=None)
+            key = f'bench-{n}'
+            save_artifact(key, rf_model, scaler, feature_cols, trained[9], {}, CategoryEncoder.fit(df), model_dir)
+            combined_path = os.path.join(model_dir, f'combined-{n}.pkl')
+            with open(combined_path, 'wb') as f:
+                pickle.dump((trained, evaluation_summary(y_test, y_pred, rf_model.classes_)), f)
+            del trained, rf_model
+            for kind, path in [('serving', os.path.join(model_dir, key)), ('combined', combined_path)]:
+                out = subprocess.run([sys.executable, os.path.abspath(__file__), '--serving-memory-child', kind,
+                                      path], capture_output=True, text=True, check=True)
+                result = json.loads(out.stdout.strip().splitlines()[-1])
+                results.append({'case': f'worker_memory_{kind}', 'params': {'rows': n}, 'seconds': 0.0,
+                                **result})
+    return results
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# Current RSS and its private (anonymous) part, from /proc/self/status
+def process_memory_mb():
+    memory = {'rss': peak_rss_mb(), 'anon': 0.0}
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    memory['rss'] = int(line.split()[1]) / 1024
+                elif line.startswith('RssAnon:'):
+                    memory['anon'] = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return memory
+
+
+# Peak RSS of this process image. On Linux ru_maxrss survives fork + exec, so a
+# child started by a large parent would report the parent's peak; VmHWM does not.
+def process_peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def case_id(result):
+    return result['case'] + json.dumps(result['params'], sort_keys=True)
+
+
+def print_results(results, baseline=None):
+    previous = {case_id(r): r for r in (baseline or {}).get('results', [])}
+    print(f"{'case':<24} {'params':<32} {'seconds':>10} {'rows/s':>13} {'peak MB':>8}"
+          + ('  vs baseline' if baseline else ''))
+    for r in results:
+        params = ', '.join(f'{k}={v}' for k, v in r['params'].items())
+        line = (f"{r['case']:<24} {params:<32} {r['seconds']:>10.5f} "
+                f"{r.get('rows_per_second', 0):>13,.0f} {r.get('peak_mb', 0):>8.1f}")
+        if case_id(r) in previous:
+            line += f"  {r['seconds'] / previous[case_id(r)]['seconds']:>6.2f}x"
+        print(line)
+        for stage, seconds in r.get('stages', {}).items():
+            print(f"  {stage:<22} {'':<32} {seconds:>10.5f}")
+        if 'macro_f1' in r:
+            print(f"  {'macro F1':<22} {'':<32} {r['macro_f1']:>10.4f}")
+        if 'anon_growth_mb' in r:
+            print(f"  {'':<22} {'':<32} RSS {r['rss_mb']:.0f} MB, +{r['rss_growth_mb']:.1f} MB on load "
+                  f"(+{r['anon_growth_mb']:.1f} MB private)")
+        if 'peak_rss_mb' in r:
+            print(f"  {'':<22} {'':<32} peak RSS {r['peak_rss_mb']:.0f} MB, "
+                  f"+{r['rss_growth_mb']:.0f} MB while training")
+        if 'p50_ms' in r:
+            print(f"  {'':<22} {'':<32} p50 {r['p50_ms']:.3f} ms  p95 {r['p95_ms']:.3f} ms  "
+                  f"p99 {r['p99_ms']:.3f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark data loading, training and prediction.")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--n-jobs', type=int, default=N_JOBS)
+    parser.add_argument('--quick', action='store_true', help="Skip the 1M-row cases")
+    parser.add_argument('--only', nargs='+',
+                        choices=['load', 'train', 'train_memory', 'imbalance', 'single', 'batch', 'cache',
+                                 'serving_memory', 'risk'],
+                        default=['load', 'train', 'train_memory', 'imbalance', 'single', 'batch', 'cache',
+                                 'serving_memory', 'risk'])
+    parser.add_argument('--output', default=None, help="Write results as JSON")
+    parser.add_argument('--compare', default=None, help="Earlier JSON results to compare against")
+    parser.add_argument('--train-memory-child', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--serving-memory-child', nargs=2, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.train_memory_child:
+        print(json.dumps(train_memory_child(args.train_memory_child, args.n_jobs)))
+        return 0
+    if args.serving_memory_child:
+        print(json.dumps(serving_memory_child(*args.serving_memory_child)))
+        return 0
+
+    load_rows = QUICK_ROWS if args.quick else LOAD_ROWS
+    batch_rows = QUICK_ROWS if args.quick else BATCH_ROWS
+    train_memory_rows = TRAIN_MEMORY_ROWS[:1] if args.quick else TRAIN_MEMORY_ROWS
+    imbalance_rows = IMBALANCE_ROWS[:2] if args.quick else IMBALANCE_ROWS
+    serving_memory_rows = SERVING_MEMORY_ROWS[:1] if args.quick else SERVING_MEMORY_ROWS
+    risk_rows = QUICK_ROWS if args.quick else RISK_ROWS
+
+    results = []
+    if 'load' in args.only:
+        results += load_cases(load_rows, args.repeats)
+    if 'train' in args.only:
+        results += train_cases(TRAIN_ROWS, args.repeats, args.n_jobs)
+    if 'train_memory' in args.only:
+        results += train_memory_cases(train_memory_rows, args.n_jobs)
+    if 'imbalance' in args.only:
+        results += imbalance_cases(imbalance_rows, args.n_jobs)
+    if {'single', 'batch', 'cache'} & set(args.only):
+        trained = train_model(generate_synthetic_data(MODEL_ROWS), {'n_jobs': args.n_jobs})
+        if 'cache' in args.only:
+            results += cache_cases(trained, args.repeats)
+        rf_model, scaler, feature_cols = trained[:3]
+        rf_model.set_params(n_jobs=None)
+        model = (rf_model, scaler, feature_cols, trained[9])
+        if 'single' in args.only:
+            results += single_row_cases(model, SINGLE_ROW_ITERATIONS)
+        if 'batch' in args.only:
+            results += batch_cases(model, batch_rows, args.repeats, args.n_jobs)
+    if 'serving_memory' in args.only:
+        results += serving_memory_cases(serving_memory_rows, args.n_jobs)
+    if 'risk' in args.only:
+        results += risk_cases(risk_rows, args.repeats, SINGLE_ROW_ITERATIONS)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'commit': git_commit(),
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'sklearn': sklearn.__version__,
+                'cpu_count': os.cpu_count(),
+                'repeats': args.repeats,
+                'max_rss_mb': peak_rss_mb(),
+                'results': results,
+            }, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
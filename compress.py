@@ -0,0 +1,250 @@
+# Post-training forest compression against a held-out accuracy tolerance
+#
+#   python compress.py --tolerance 0.01      # trade-off report for the training data
+#   python train.py --compress 0.01          # publish the compressed model
+#
+# Three stages, each accepted only while held-out accuracy stays within
+# `tolerance` of the uncompressed forest:
+#   1. greedy forward tree selection (smallest subset that keeps accuracy)
+#   2. a depth cap (nodes at the cap become leaves)
+#   3. leaf merging (sibling leaves with near-identical class distributions
+#      collapse into their parent)
+# Trees are rebuilt with only their reachable nodes, so the result is an
+# ordinary, smaller RandomForestClassifier: predict_proba, joblib artifacts,
+# CompiledForest and FastPredictor all work on it unchanged.
+import argparse
+import copy
+import sys
+import time
+
+import numpy as np
+
+from inference import CompiledForest, standardize
+
+# Total-variation distances tried for leaf merging, least aggressive first
+MERGE_THRESHOLDS = [0.02, 0.05, 0.1, 0.2, 0.3, 0.5]
+
+# Single-row calls timed per reported forest
+LATENCY_CALLS = 200
+
+# Smallest forest the tree-subset stage may keep
+MIN_TREES = 10
+
+
+def _normalized(values):
+    return values / values.sum(axis=-1, keepdims=True)
+
+
+# Copy of `tree` keeping only the nodes reachable when every node in `leaves`
+# (and every original leaf) is a leaf
+def rebuild_tree(tree, leaves):
+    from sklearn.tree._tree import Tree
+
+    state = tree.__getstate__()
+    nodes, values = state['nodes'], state['values']
+    order, depth_of, max_depth = [], {}, 0
+    stack = [(0, 0)]
+    while stack:
+        node, depth = stack.pop()
+        order.append(node)
+        depth_of[node] = depth
+        max_depth = max(max_depth, depth)
+        if nodes['left_child'][node] != -1 and node not in leaves:
+            stack.append((nodes['right_child'][node], depth + 1))
+            stack.append((nodes['left_child'][node], depth + 1))
+    new_index = {node: i for i, node in enumerate(order)}
+
+    new_nodes = nodes[order].copy()
+    for i, node in enumerate(order):
+        if nodes['left_child'][node] == -1 or node in leaves:
+            new_nodes['left_child'][i] = new_nodes['right_child'][i] = -1
+            new_nodes['feature'][i] = -2
+            new_nodes['threshold'][i] = -2.0
+        else:
+            new_nodes['left_child'][i] = new_index[nodes['left_child'][node]]
+            new_nodes['right_child'][i] = new_index[nodes['right_child'][node]]
+
+    rebuilt = Tree(tree.n_features, np.array(tree.n_classes, dtype=np.intp), tree.n_outputs)
+    rebuilt.__setstate__({'max_depth': max_depth, 'node_count': len(order),
+                          'nodes': new_nodes, 'values': values[order].copy()})
+    return rebuilt
+
+
+def cap_depth(tree, max_depth):
+    depth = np.zeros(tree.node_count, dtype=np.intp)
+    leaves = set()
+    for node in range(tree.node_count):
+        # sklearn stores parents before children, so depth[node] is final here
+        if tree.children_left[node] != -1:
+            if depth[node] >= max_depth:
+                leaves.add(node)
+            depth[tree.children_left[node]] = depth[tree.children_right[node]] = depth[node] + 1
+    return rebuild_tree(tree, leaves)
+
+
+# Collapse, bottom-up, every split whose two (possibly already collapsed)
+# children are leaves within `threshold` total-variation distance
+def merge_leaves(tree, threshold):
+    left, right = tree.children_left, tree.children_right
+    values = _normalized(tree.value[:, 0, :])
+    is_leaf = left == -1
+    leaves = set()
+    for node in range(tree.node_count - 1, -1, -1):
+        if is_leaf[node]:
+            continue
+        l, r = left[node], right[node]
+        if is_leaf[l] and is_leaf[r] and 0.5 * np.abs(values[l] - values[r]).sum() <= threshold:
+            is_leaf[node] = True
+            leaves.add(node)
+    return rebuild_tree(tree, leaves)
+
+
+# Forest sharing `rf_model`'s settings with the given fitted trees
+def with_trees(rf_model, trees):
+    forest = copy.copy(rf_model)
+    forest.estimators_ = []
+    for estimator, tree in trees:
+        estimator = copy.copy(estimator)
+        estimator.tree_ = tree
+        forest.estimators_.append(estimator)
+    forest.n_estimators = len(forest.estimators_)
+    return forest
+
+
+# (accuracy, mean probability given to the true class) on held-out rows
+def score(rf_model, X, y):
+    proba = rf_model.predict_proba(X)
+    y_index = np.searchsorted(rf_model.classes_, y)
+    return float(np.mean(proba.argmax(axis=1) == y_index)), float(proba[np.arange(len(y)), y_index].mean())
+
+
+# Greedy forward selection: repeatedly add the tree that most raises the mean
+# true-class probability on the held-out rows. Maximizing that smooth score
+# generalizes far better than maximizing accuracy, which a handful of trees
+# can overfit on a small validation set. Returns the order and the
+# (accuracy, probability) after each addition.
+def greedy_tree_order(rf_model, X, y):
+    y_index = np.searchsorted(rf_model.classes_, y)
+    rows = np.arange(len(y))
+    tree_proba = np.stack([_normalized(est.predict_proba(X)) for est in rf_model.estimators_])
+    total = np.zeros(tree_proba.shape[1:])
+    remaining = list(range(len(tree_proba)))
+    order, curve = [], []
+    while remaining:
+        candidates = (total[None] + tree_proba[remaining]) / (len(order) + 1)
+        true_proba = candidates[:, rows, y_index].mean(axis=1)
+        best = int(true_proba.argmax())
+        correct = float(np.mean(candidates[best].argmax(axis=1) == y_index))
+        tree = remaining.pop(best)
+        total += tree_proba[tree]
+        order.append(tree)
+        curve.append((correct, float(true_proba[best])))
+    return order, curve
+
+
+def forest_cost(rf_model, X):
+    forest = CompiledForest.from_sklearn(rf_model)
+    row = np.ascontiguousarray(X[:1], dtype=np.float32)
+    forest.predict_proba(row)
+    samples = []
+    for _ in range(LATENCY_CALLS):
+        start = time.perf_counter()
+        forest.predict_proba(row)
+        samples.append(time.perf_counter() - start)
+    return {
+        'n_trees': forest.n_trees,
+        'n_nodes': int(len(forest.threshold)),
+        'max_depth': forest.max_depth,
+        'size_kb': sum(getattr(forest, name).nbytes for name in CompiledForest.ARRAYS) / 1024,
+        'latency_ms': float(np.median(samples) * 1000),
+    }
+
+
+# Smaller forest whose held-out accuracy and true-class probability on
+# (X_val, y_val) -- scaled model inputs -- are each at most `tolerance` below
+# the original's. With (X_test, y_test), rows never used for selection, every
+# step also reports test accuracy.
+def compress_forest(rf_model, X_val, y_val, tolerance=0.01, min_trees=MIN_TREES, X_test=None, y_test=None):
+    X_val = np.asarray(X_val, dtype=np.float32)
+    y_val = np.asarray(y_val)
+    base_accuracy, base_proba = score(rf_model, X_val, y_val)
+
+    def acceptable(accuracy, true_proba):
+        return accuracy >= base_accuracy - tolerance and true_proba >= base_proba - tolerance
+
+    steps = []
+
+    def record(stage, model, **extra):
+        accuracy, true_proba = score(model, X_val, y_val)
+        step = dict(stage=stage, accuracy=accuracy, true_proba=true_proba, **extra)
+        if X_test is not None:
+            step['test_accuracy'] = score(model, np.asarray(X_test, dtype=np.float32), np.asarray(y_test))[0]
+        steps.append(dict(step, **forest_cost(model, X_val)))
+
+    record('original', rf_model)
+
+    order, curve = greedy_tree_order(rf_model, X_val, y_val)
+    n_trees = next((k + 1 for k, point in enumerate(curve) if k + 1 >= min_trees and acceptable(*point)),
+                   len(order))
+    trees = [(rf_model.estimators_[i], rf_model.estimators_[i].tree_) for i in order[:n_trees]]
+    compressed = with_trees(rf_model, trees)
+    record('tree_subset', compressed, subset_curve=curve)
+
+    for max_depth in range(max(tree.max_depth for _, tree in trees) - 1, 0, -1):
+        capped_trees = [(est, cap_depth(tree, max_depth)) for est, tree in trees]
+        capped = with_trees(rf_model, capped_trees)
+        if not acceptable(*score(capped, X_val, y_val)):
+            break
+        trees, compressed = capped_trees, capped
+    record('depth_cap', compressed)
+
+    merged_at = None
+    for threshold in MERGE_THRESHOLDS:
+        merged = with_trees(rf_model, [(est, merge_leaves(tree, threshold)) for est, tree in trees])
+        if not acceptable(*score(merged, X_val, y_val)):
+            break
+        compressed, merged_at = merged, threshold
+    if merged_at is not None:
+        record('leaf_merge', compressed, threshold=merged_at)
+
+    return compressed, {'tolerance': tolerance, 'min_trees': min_trees, 'steps': steps}
+
+
+def print_report(report):
+    print(f"{'stage':<12} {'val acc':>8} {'val p':>6} {'test acc':>9} {'trees':>6} {'depth':>6} "
+          f"{'nodes':>8} {'size KB':>8} {'lat ms':>7}")
+    for step in report['steps']:
+        test_accuracy = f"{step['test_accuracy']:>9.4f}" if 'test_accuracy' in step else f"{'-':>9}"
+        print(f"{step['stage']:<12} {step['accuracy']:>8.4f} {step['true_proba']:>6.3f} {test_accuracy} "
+              f"{step['n_trees']:>6} {step['max_depth']:>6} {step['n_nodes']:>8} {step['size_kb']:>8.0f} "
+              f"{step['latency_ms']:>7.3f}")
+
+
+# Split train_model's held-out rows into a selection half and a test half
+def split_holdout(X_holdout, y_holdout, seed=42):
+    from sklearn.model_selection import train_test_split
+
+    return train_test_split(X_holdout, np.asarray(y_holdout), test_size=0.5, random_state=seed,
+                            stratify=y_holdout)
+
+
+def main(argv=None):
+    from sleep_model import DATA_PATH, load_data, train_model
+
+    parser = argparse.ArgumentParser(description="Compress the trained forest within an accuracy tolerance.")
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--tolerance', type=float, default=0.01,
+                        help="Largest acceptable held-out accuracy / probability drop (default 0.01)")
+    parser.add_argument('--min-trees', type=int, default=MIN_TREES)
+    args = parser.parse_args(argv)
+
+    rf_model, scaler, feature_cols, acc, y_test, y_pred, X_train, X_test, _, _ = train_model(load_data(args.data))
+    rf_model.set_params(n_jobs=None)
+    X_val, X_check, y_val, y_check = split_holdout(standardize(X_test, scaler.mean_, scaler.scale_), y_test)
+    compressed, report = compress_forest(rf_model, X_val, y_val, args.tolerance, args.min_trees, X_check, y_check)
+    print_report(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,2 @@
+# Puts the repository root on sys.path, so a plain `pytest` run from the root
+# imports the top-level modules the tests use
@@ -0,0 +1,175 @@
+# Typed Arrow cache for the Excel data sources
+#
+# Reading .xlsx through openpyxl is slow and used to happen in every new
+# process. The first load converts the sheet once (categorical columns
+# label-encoded, every column downcast to its most compact dtype) and writes an
+# uncompressed Arrow IPC file plus a JSON sidecar holding the encoder classes
+# and the source signature. Later loads memory-map that file, so numeric
+# columns reach pandas without being copied or parsed.
+#
+# The cache is invalidated when the source changes: a matching size and mtime
+# is trusted as-is; otherwise the content hash decides (a touched but
+# unchanged file keeps its cache). The sidecar also records the dataset
+# fingerprint (content hash + encoded schema + format version) that model
+# artifacts are keyed by, so computing a key costs a stat() rather than a
+# pass over the data.
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from encoding import CATEGORICAL_COLUMNS, CategoryEncoder
+
+DATA_CACHE_DIR = os.environ.get('SLEEP_DATA_CACHE_DIR', 'data_cache')
+
+# Bump when the conversion below changes
+CACHE_FORMAT_VERSION = 2
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Smallest integer type for integer columns, float32 for floats, int8 for codes
+def compact_dtypes(df, categorical=()):
+    columns = {}
+    for col in df.columns:
+        values = df[col]
+        if col in categorical:
+            columns[col] = values.astype(np.int8)
+        elif pd.api.types.is_integer_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            columns[col] = pd.to_numeric(values, downcast='integer')
+        elif pd.api.types.is_float_dtype(values):
+            columns[col] = values.astype(np.float32)
+        else:
+            columns[col] = values
+    return pd.DataFrame(columns)
+
+
+def _cache_paths(path, categorical, cache_dir):
+    ident = json.dumps([os.path.abspath(path), sorted(categorical)])
+    stem = os.path.basename(path) + '-' + hashlib.sha256(ident.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(cache_dir, stem + '.arrow'), os.path.join(cache_dir, stem + '.json')
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# Temp name unique to this process and thread: workers converting the same
+# source at once each write their own file, and the last os.replace wins
+def _tmp_path(path):
+    return f'{path}.tmp-{os.getpid()}-{threading.get_ident()}'
+
+
+# Write through `write(tmp_path)` then move into place; no temp file is left
+# behind on failure
+def _replace_atomic(path, write):
+    tmp_path = _tmp_path(path)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _write_json(path, data):
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+    _replace_atomic(path, write)
+
+
+# Memory-mapped read; the returned frame keeps the mapping alive
+def read_arrow(arrow_path):
+    source = pa.memory_map(arrow_path, 'r')
+    table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def write_arrow(df, arrow_path):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    def write(tmp_path):
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    _replace_atomic(arrow_path, write)
+
+
+# Sidecar of a cache entry that is still valid for the source, or None
+def _current_meta(path, arrow_path, meta_path):
+    stat = os.stat(path)
+    meta = _read_meta(meta_path)
+    if meta is None or meta['format'] != CACHE_FORMAT_VERSION or not os.path.exists(arrow_path):
+        return None
+    if meta['size'] == stat.st_size and meta['mtime_ns'] == stat.st_mtime_ns:
+        return meta
+    if meta['size'] == stat.st_size and meta['sha256'] == file_sha256(path):
+        meta['mtime_ns'] = stat.st_mtime_ns
+        _write_json(meta_path, meta)
+        return meta
+    return None
+
+
+# Convert the source and write the cache entry; returns its sidecar
+def _build(path, categorical, arrow_path, meta_path, cache_dir):
+    stat = os.stat(path)
+    sha256 = file_sha256(path)
+    df = pd.read_excel(path)
+    encoder = CategoryEncoder.fit(df, categorical)
+    encoders = encoder.to_dict()
+    df = compact_dtypes(encoder.transform(df), encoders)
+    os.makedirs(cache_dir, exist_ok=True)
+    write_arrow(df, arrow_path)
+    dtypes = {col: str(dtype) for col, dtype in df.dtypes.items()}
+    signature = {'sha256': sha256, 'format': CACHE_FORMAT_VERSION, 'encoders': encoders, 'dtypes': dtypes}
+    meta = {
+        'format': CACHE_FORMAT_VERSION,
+        'source': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': sha256,
+        'fingerprint': hashlib.sha256(json.dumps(signature, sort_keys=True).encode('utf-8')).hexdigest(),
+        'encoders': encoders,
+        'dtypes': dtypes,
+    }
+    _write_json(meta_path, meta)
+    return meta
+
+
+# (DataFrame, {column: encoder classes}) for an Excel file, converting it on the
+# first call and whenever the source changes. Raises FileNotFoundError like
+# pd.read_excel when the source is missing.
+def load_table(path, categorical=CATEGORICAL_COLUMNS, cache_dir=DATA_CACHE_DIR):
+    arrow_path, meta_path = _cache_paths(path, categorical, cache_dir)
+    meta = _current_meta(path, arrow_path, meta_path)
+    if meta is None:
+        meta = _build(path, categorical, arrow_path, meta_path, cache_dir)
+    return read_arrow(arrow_path), meta['encoders']
+
+
+# Dataset fingerprint of an Excel file as load_table would return it. Converts
+# the file if it is not cached yet, after which the call is a stat().
+def table_fingerprint(path, categorical=CATEGORICAL_COLUMNS, cache_dir=DATA_CACHE_DIR):
+    arrow_path, meta_path = _cache_paths(path, categorical, cache_dir)
+    meta = _current_meta(path, arrow_path, meta_path)
+    if meta is None:
+        meta = _build(path, categorical, arrow_path, meta_path, cache_dir)
+    return meta['fingerprint']
@@ -0,0 +1,45 @@
+# Categorical encoding schema shared by training, batch scoring and the form
+#
+# Each categorical column maps its source values (sorted, as LabelEncoder
+# would) to codes 0..n-1. The schema is fitted once when a data file is
+# ingested, saved with the model artifact, and then only applied: scoring
+# inputs are encoded with the classes the model was trained on, never refitted.
+import numpy as np
+import pandas as pd
+
+# Columns holding source categories rather than measurements
+CATEGORICAL_COLUMNS = ['Gender', 'Academic Level', 'BMI Category']
+
+
+class CategoryEncoder:
+    def __init__(self, categories):
+        self.categories = {col: list(classes) for col, classes in categories.items()}
+        self._index = {col: pd.Index(classes) for col, classes in self.categories.items()}
+
+    @classmethod
+    def fit(cls, df, columns=CATEGORICAL_COLUMNS):
+        return cls({col: sorted(pd.unique(df[col].dropna()).tolist()) for col in columns if col in df.columns})
+
+    # Codes for every schema column present in `df`, one vectorized lookup per
+    # column; unknown values raise ValueError instead of becoming a bogus code
+    def transform(self, df):
+        encoded = {}
+        for col, index in self._index.items():
+            if col not in df.columns:
+                continue
+            codes = index.get_indexer(df[col])
+            if (codes < 0).any():
+                unknown = sorted(map(str, pd.unique(df[col][codes < 0])))
+                raise ValueError(f"Unknown {col} values: {', '.join(unknown)} "
+                                 f"(expected one of {', '.join(map(str, self.categories[col]))})")
+            encoded[col] = codes.astype(np.int8)
+        return df.assign(**encoded)
+
+    def encode(self, col, value):
+        return self.categories[col].index(value)
+
+    def decode(self, col, code):
+        return self.categories[col][code]
+
+    def to_dict(self):
+        return {col: list(classes) for col, classes in self.categories.items()}
@@ -0,0 +1,98 @@
+# Class-imbalance stage of the training pipeline
+#
+#   smote          exact SMOTE from imbalanced-learn (the default)
+#   smote_blocked  SMOTE whose neighbour search runs inside random blocks of
+#                  SMOTE_BLOCK_ROWS rows of each class, blocks in parallel:
+#                  neighbours are approximate, cost grows linearly with the data
+#   undersample    per-class random undersampling down to the rarest class
+#   class_weight   no resampling; RandomForest's class_weight='balanced'
+#                  (part of MODEL_PARAMS) reweights the classes instead
+#
+# Every strategy takes the weighted float32 training matrix and its labels and
+# returns the matrix the forest is fitted on. Compare them on a given data size
+# with `python bench_suite.py --only imbalance`.
+import numpy as np
+import pandas as pd
+
+IMBALANCE_STRATEGIES = ('smote', 'smote_blocked', 'undersample', 'class_weight')
+DEFAULT_STRATEGY = 'smote'
+
+# Neighbours each synthetic sample may be interpolated towards
+SMOTE_K = 3
+
+# Rows per neighbour-search block for smote_blocked
+SMOTE_BLOCK_ROWS = 20000
+
+
+# For each of `rows`, the positions (in `rows`) of its k nearest neighbours
+# within its own block of consecutive positions
+def _blocked_neighbors(X, rows, k, blocks, n_jobs):
+    from joblib import Parallel, delayed
+    from sklearn.neighbors import NearestNeighbors
+
+    def search(block):
+        nn = NearestNeighbors(n_neighbors=k).fit(X[rows[block]])
+        return block[nn.kneighbors(return_distance=False)]
+
+    # The tree queries release the GIL, so threads spread the blocks over cores
+    return np.concatenate(Parallel(n_jobs=n_jobs, prefer='threads')(delayed(search)(block) for block in blocks))
+
+
+def smote_blocked(X, y, k=SMOTE_K, block_rows=SMOTE_BLOCK_ROWS, n_jobs=None, random_state=42):
+    rng = np.random.RandomState(random_state)
+    codes, classes = pd.factorize(y)
+    counts = np.bincount(codes)
+    target = counts.max()
+    n_new = int((target - counts).sum())
+    X_res = np.empty((len(X) + n_new, X.shape[1]), dtype=np.float32)
+    X_res[:len(X)] = X
+    y_res = np.empty(len(X) + n_new, dtype=y.dtype)
+    y_res[:len(X)] = y
+    start = len(X)
+    for code, count in enumerate(counts):
+        if count == target:
+            continue
+        # Random blocks: each row's neighbours come from a random sample of its class
+        rows = rng.permutation(np.flatnonzero(codes == code))
+        blocks = np.array_split(np.arange(count), max(1, -(-count // block_rows)))
+        k_class = min(k, len(blocks[-1]) - 1)
+        if k_class < 1:
+            raise ValueError(f"Class {classes[code]!r} has too few rows to oversample")
+        # kneighbors() without query points excludes each row itself
+        neighbors = _blocked_neighbors(X, rows, k_class, blocks, n_jobs)
+        n = target - count
+        pick = rng.randint(count, size=n)
+        base = rows[pick]
+        towards = rows[neighbors[pick, rng.randint(k_class, size=n)]]
+        gap = rng.random_sample((n, 1)).astype(np.float32)
+        X_res[start:start + n] = X[base] + gap * (X[towards] - X[base])
+        y_res[start:start + n] = classes[code]
+        start += n
+    return X_res, y_res
+
+
+def undersample(X, y, random_state=42):
+    rng = np.random.RandomState(random_state)
+    codes, classes = pd.factorize(y)
+    n_keep = np.bincount(codes).min()
+    keep = np.sort(np.concatenate([rng.choice(np.flatnonzero(codes == code), n_keep, replace=False)
+                                   for code in range(len(classes))]))
+    return X[keep], y[keep]
+
+
+# (X, y) to fit on. With 'class_weight' the inputs themselves are returned.
+def resample(X, y, strategy=DEFAULT_STRATEGY, n_jobs=None, random_state=42):
+    if strategy == 'smote':
+        from imblearn.over_sampling import SMOTE
+
+        # Fewer neighbours when a class is too small for SMOTE_K (small update windows)
+        k = min(SMOTE_K, int(pd.Series(y).value_counts().min()) - 1)
+        smote = SMOTE(random_state=random_state, k_neighbors=k)
+        return smote.fit_resample(X, y)
+    if strategy == 'smote_blocked':
+        return smote_blocked(X, y, n_jobs=n_jobs, random_state=random_state)
+    if strategy == 'undersample':
+        return undersample(X, y, random_state)
+    if strategy == 'class_weight':
+        return X, y
+    raise ValueError(f"Unknown imbalance strategy {strategy!r} (expected one of {', '.join(IMBALANCE_STRATEGIES)})")
@@ -0,0 +1,254 @@
+# Incremental retraining as new labeled records arrive
+#
+#   python incremental.py ingest clinic_week_42.csv   # append a batch of labeled rows
+#   python incremental.py update                      # grow the published forest on it
+#   python incremental.py update --every 600          # keep updating in the background
+#   python incremental.py update --refit              # full refit on base data + batches
+#
+# Ingestion is append-only: each batch is validated, encoded with the published
+# model's category schema and written once as its own Arrow file under
+# INCREMENTS_DIR; identical batches are skipped. An update first scores the
+# served model on the unseen batches (test-then-train accuracy), then adds
+# GROW_TREES warm-started trees fitted on a bounded window of the most recent
+# rows with the frozen scaler, so its cost does not grow with the history.
+# Once MAX_GROWN_TREES trees have been added the next update refits from
+# scratch instead. Every result is published through the model store's LATEST
+# pointer, which running app workers poll and swap in without a restart
+# (model_reload.ModelHandle).
+import argparse
+import copy
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from sleep_model import (DATA_PATH, MODEL_DIR, N_JOBS, compress_model, load_data, load_latest_artifact,
+                         save_artifact, train_model, training_config)
+from data_cache import compact_dtypes, read_arrow, write_arrow
+from batch_predict import COLUMN_ALIASES, read_table
+from imbalance import resample
+from inference import FastPredictor, standardize, weigh
+
+INCREMENTS_DIR = os.environ.get('SLEEP_INCREMENTS_DIR', 'increments')
+
+LABEL_COL = 'Sleep Disorder'
+
+# Trees added per update, and how many added trees trigger a full refit
+GROW_TREES = 20
+MAX_GROWN_TREES = 100
+
+# Most recent rows the new trees are fitted on
+GROW_WINDOW = 5000
+
+# Fewest rows per class in that window (older rows of the class are added)
+MIN_CLASS_ROWS = 6
+
+
+# (name, DataFrame) for every ingested batch, oldest first
+def read_increments(increments_dir=INCREMENTS_DIR):
+    paths = sorted(glob.glob(os.path.join(increments_dir, 'batch-*.arrow')))
+    return [(os.path.basename(path), read_arrow(path)) for path in paths]
+
+
+# Validate and encode labeled records and append them as a new batch file.
+# Returns the batch name, or None if the same records were already ingested.
+def ingest(df, artifact, increments_dir=INCREMENTS_DIR):
+    feature_cols = artifact['feature_cols']
+    df = df.rename(columns=COLUMN_ALIASES)
+    missing = [col for col in feature_cols + [LABEL_COL] if col not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    df = artifact['encoder'].transform(df[feature_cols + [LABEL_COL]].reset_index(drop=True))
+    if df[feature_cols].isna().any().any() or df[LABEL_COL].isna().any():
+        raise ValueError("Labeled records must not have missing values")
+    classes = [str(c) for c in artifact['model'].classes_]
+    unknown = sorted(set(df[LABEL_COL].astype(str)) - set(classes))
+    if unknown:
+        raise ValueError(f"Unknown {LABEL_COL} labels: {', '.join(unknown)} (expected one of "
+                         f"{', '.join(classes)}); a new class needs a full `python train.py`")
+    df = compact_dtypes(df, artifact['encoder'].categories)
+
+    digest = hashlib.sha256(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()).hexdigest()[:16]
+    os.makedirs(increments_dir, exist_ok=True)
+    existing = sorted(glob.glob(os.path.join(increments_dir, 'batch-*.arrow')))
+    if any(path.endswith(f'-{digest}.arrow') for path in existing):
+        return None
+    tmp_path = os.path.join(increments_dir, f'.{digest}.tmp-{os.getpid()}')
+    write_arrow(df, tmp_path)
+    # Hard-link under the next free sequence number: never overwrites a batch,
+    # even when two ingests race
+    seq = len(existing) + 1
+    try:
+        while True:
+            name = f'batch-{seq:06d}-{digest}.arrow'
+            try:
+                os.link(tmp_path, os.path.join(increments_dir, name))
+                return name
+            except FileExistsError:
+                seq += 1
+    finally:
+        os.remove(tmp_path)
+
+
+# The most recent `window` rows, topped up with the latest older rows of any
+# class that would otherwise be too rare to resample
+def training_window(df, classes, window=GROW_WINDOW):
+    recent, older = df.iloc[-window:], df.iloc[:-window]
+    extra = []
+    for label in classes:
+        short = MIN_CLASS_ROWS - int((recent[LABEL_COL] == label).sum())
+        if short > 0:
+            extra.append(older[older[LABEL_COL] == label].iloc[-short:])
+    window_df = pd.concat(extra + [recent])
+    counts = window_df[LABEL_COL].value_counts()
+    if any(counts.get(label, 0) < 2 for label in classes):
+        raise ValueError(f"Too few rows of some classes to grow the forest: {counts.to_dict()}")
+    return window_df
+
+
+# Copy of the artifact's forest with `grow_trees` more trees fitted on the
+# recent window, resampled with the artifact's imbalance strategy. The scaler
+# stays frozen because the existing trees split on its output.
+def grow_forest(artifact, df, grow_trees=GROW_TREES, window=GROW_WINDOW, n_jobs=N_JOBS):
+    rf_model, scaler, feature_cols = artifact['model'], artifact['scaler'], artifact['feature_cols']
+    window_df = training_window(df, rf_model.classes_, window)
+    X = weigh(window_df[feature_cols].to_numpy(),
+              np.sqrt([artifact['feature_weights'].get(col, 1.0) for col in feature_cols]))
+    y = window_df[LABEL_COL].astype(str).to_numpy()
+    X_res, y_res = resample(X, y, training_config(artifact)['imbalance'], n_jobs)
+
+    grown = copy.copy(rf_model)
+    # Fresh list: warm_start appends to estimators_, which the served model shares
+    grown.estimators_ = list(rf_model.estimators_)
+    grown.set_params(warm_start=True, n_estimators=len(grown.estimators_) + grow_trees, n_jobs=n_jobs)
+    with warnings.catch_warnings():
+        # Intended here: the balanced weights are computed on the resampled window
+        warnings.filterwarnings('ignore', message='class_weight presets')
+        grown.fit(standardize(X_res, scaler.mean_, scaler.scale_, out=X_res), y_res)
+    grown.set_params(warm_start=False, n_jobs=None)
+    return grown
+
+
+# Accuracy of the served model on records it has not been trained on
+def prequential_accuracy(artifact, df):
+    predictor = FastPredictor.from_artifact(artifact)
+    proba = predictor.predict_proba(df[predictor.feature_cols].to_numpy(dtype=np.float64))
+    return float(np.mean(predictor.classes_[proba.argmax(axis=1)] == df[LABEL_COL].astype(str).to_numpy()))
+
+
+# Grow (or, past MAX_GROWN_TREES, refit) the published model on the batches it
+# has not seen and publish the result. Returns the report, or None when there
+# is nothing new.
+def update_model(artifact, base_df, batches, grow_trees=GROW_TREES, max_grown_trees=MAX_GROWN_TREES,
+                 refit=False, n_jobs=N_JOBS, model_dir=MODEL_DIR):
+    start = time.perf_counter()
+    info = artifact['metrics'].get('incremental', {})
+    seen = set(info.get('batches', []))
+    new = [(name, df) for name, df in batches if name not in seen]
+    if not new:
+        return None
+    new_rows = pd.concat([df for _, df in new], ignore_index=True)
+    history = pd.concat([base_df] + [df for _, df in batches], ignore_index=True)
+    grown_trees = info.get('grown_trees', 0) + grow_trees
+    refit = refit or grown_trees > max_grown_trees
+
+    report = {
+        'parent': artifact['key'],
+        'mode': 'refit' if refit else 'grow',
+        'batches': [name for name, _ in batches],
+        'new_rows': int(len(new_rows)),
+        'n_rows': int(len(history)),
+        'prequential_accuracy': prequential_accuracy(artifact, new_rows),
+    }
+    # A refit reproduces the parent's configuration; grown models pass it on
+    config = training_config(artifact)
+    if refit:
+        (rf_model, scaler, feature_cols, accuracy, y_test, _, _, X_test,
+         feature_importance, feature_weights) = train_model(history, dict(config['params'], n_jobs=n_jobs),
+                                                            imbalance=config['imbalance'])
+        if config['compression'] is not None:
+            rf_model, compression_report, X_check, y_check = compress_model(rf_model, scaler, X_test, y_test,
+                                                                            config['compression'])
+            accuracy = np.mean(rf_model.predict(X_check) == y_check)
+            feature_importance = dict(zip(feature_cols, rf_model.feature_importances_))
+            report['compression'] = {name: value for name, value in compression_report.items() if name != 'steps'}
+        rf_model.set_params(n_jobs=None)
+        report['grown_trees'] = 0
+        # Held-out accuracy of this refit (the unused hold-out half when compressed)
+        report['accuracy'] = float(accuracy)
+    else:
+        rf_model = grow_forest(artifact, history, grow_trees, n_jobs=n_jobs)
+        scaler, feature_cols, feature_weights = artifact['scaler'], artifact['feature_cols'], \
+            artifact['feature_weights']
+        feature_importance = dict(zip(feature_cols, rf_model.feature_importances_))
+        report['grown_trees'] = grown_trees
+        # No untouched hold-out remains after growing; keep the last full fit's
+        report['accuracy'] = artifact['metrics']['accuracy']
+
+    key_spec = {'parent': artifact['key'], 'batches': report['batches'], 'mode': report['mode'],
+                'grow_trees': grow_trees}
+    key = hashlib.sha256(json.dumps(key_spec, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    report['train_seconds'] = round(time.perf_counter() - start, 3)
+    metrics = {
+        'accuracy': report['accuracy'],
+        'feature_importance': {col: float(v) for col, v in feature_importance.items()},
+        'classes': [str(c) for c in rf_model.classes_],
+        'n_rows': report['n_rows'],
+        'train_seconds': report['train_seconds'],
+        'training': config,
+        'incremental': {name: report[name] for name in ('parent', 'mode', 'batches', 'grown_trees',
+                                                        'prequential_accuracy')},
+    }
+    save_artifact(key, rf_model, scaler, feature_cols, feature_weights, metrics, artifact['encoder'], model_dir)
+    report['key'] = key
+    report['n_trees'] = len(rf_model.estimators_)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Append labeled records and update the published model.")
+    parser.add_argument('--model-dir', default=MODEL_DIR)
+    parser.add_argument('--increments-dir', default=INCREMENTS_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+    ingest_parser = commands.add_parser('ingest', help="Append a CSV/Excel/Parquet file of labeled records")
+    ingest_parser.add_argument('input')
+    update_parser = commands.add_parser('update', help="Grow the published model on new batches")
+    update_parser.add_argument('--data', default=DATA_PATH, help="Base training data the model was fitted on")
+    update_parser.add_argument('--grow', type=int, default=GROW_TREES, help="Trees added per update")
+    update_parser.add_argument('--max-grown-trees', type=int, default=MAX_GROWN_TREES,
+                               help="Refit from scratch once more trees than this have been added")
+    update_parser.add_argument('--refit', action='store_true', help="Refit from scratch now")
+    update_parser.add_argument('--n-jobs', type=int, default=N_JOBS)
+    update_parser.add_argument('--every', type=float, default=None, metavar='SECONDS',
+                               help="Keep running, checking for new batches at this interval")
+    args = parser.parse_args(argv)
+
+    if args.command == 'ingest':
+        name = ingest(read_table(args.input), load_latest_artifact(args.model_dir), args.increments_dir)
+        print(f"Ingested {args.input} as {name}" if name else f"{args.input} was already ingested")
+        return 0
+
+    base_df = load_data(args.data)
+    while True:
+        report = update_model(load_latest_artifact(args.model_dir), base_df, read_increments(args.increments_dir),
+                              args.grow, args.max_grown_trees, args.refit, args.n_jobs, args.model_dir)
+        if report is None:
+            print("No new batches")
+        else:
+            print(f"Published {report['key']} ({report['mode']}, {report['n_trees']} trees) from "
+                  f"{report['new_rows']} new rows in {report['train_seconds']:.2f}s; "
+                  f"accuracy on them before the update: {report['prequential_accuracy']:.4f}")
+        if args.every is None:
+            return 0
+        args.refit = False
+        time.sleep(args.every)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
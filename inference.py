@@ -0,0 +1,219 @@
+# Low-latency inference path for the trained RandomForest
+import json
+
+import numpy as np
+
+from telemetry import SPANS
+
+# File signature and alignment for compiled forest files
+FOREST_MAGIC = b'SLPFRST1'
+FOREST_ALIGN = 64
+
+# Batches up to this size walk all trees at once; larger ones go tree by tree
+TRAVERSE_BLOCK_ROWS = 64
+
+# Rows per chunk for standardize's float64 temporaries
+STANDARDIZE_CHUNK_ROWS = 65536
+
+
+# Model input from raw feature rows: the sqrt feature weights are applied in
+# float32, then StandardScaler's (x - mean) / scale is evaluated in float64 and
+# rounded once to float32, the dtype the trees split on. Training
+# (sleep_model.train_model) and every serving path produce their model input
+# this way, so a row reaches the trees bit-identically whichever path scores it.
+def weigh(X, weights):
+    return np.multiply(X, np.asarray(weights, dtype=np.float32), dtype=np.float32)
+
+
+# `out` may be X itself: the result is then written in place, chunk by chunk,
+# without a full float64 copy
+def standardize(X, mean, scale, out=None):
+    if out is None:
+        out = np.empty(X.shape, dtype=np.float32)
+    for start in range(0, len(X), STANDARDIZE_CHUNK_ROWS):
+        rows = slice(start, start + STANDARDIZE_CHUNK_ROWS)
+        np.divide(np.subtract(X[rows], mean, dtype=np.float64), scale, out=out[rows], casting='same_kind')
+    return out
+
+
+# Array-backed RandomForest: every tree's nodes are concatenated into flat,
+# contiguous arrays that can be saved to (and memory-mapped from) one file.
+# Gives the same probabilities as RandomForestClassifier.predict_proba.
+class CompiledForest:
+    ARRAYS = ('roots', 'feature', 'threshold', 'children', 'leaf_proba')
+
+    def __init__(self, roots, feature, threshold, children, leaf_proba, classes, max_depth):
+        self.roots = roots              # (n_trees,) int32 global index of each root
+        self.feature = feature          # (n_nodes,) int32 split feature (0 at leaves)
+        self.threshold = threshold      # (n_nodes,) float64 split threshold
+        self.children = children        # (2 * n_nodes,) int32 [left, right] pairs; leaves point to themselves
+        self.leaf_proba = leaf_proba    # (n_nodes, n_classes) float64 normalized class probabilities
+        self.classes_ = np.asarray(classes)
+        self.max_depth = int(max_depth)
+        # Native-width copies of the (small) index arrays: gathering with int32
+        # indices makes numpy convert them on every traversal step
+        self._feature = feature.astype(np.intp)
+        self._children = children.astype(np.intp)
+
+    @classmethod
+    def from_sklearn(cls, rf_model):
+        trees = [estimator.tree_ for estimator in rf_model.estimators_]
+        sizes = np.array([tree.node_count for tree in trees])
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        n_nodes = int(sizes.sum())
+
+        feature = np.zeros(n_nodes, dtype=np.int32)
+        threshold = np.zeros(n_nodes, dtype=np.float64)
+        children = np.empty((n_nodes, 2), dtype=np.int32)
+        leaf_proba = np.empty((n_nodes, len(rf_model.classes_)), dtype=np.float64)
+        for tree, offset, size in zip(trees, offsets, sizes):
+            nodes = slice(offset, offset + size)
+            own = np.arange(offset, offset + size)
+            is_leaf = tree.children_left == -1
+            feature[nodes] = np.where(is_leaf, 0, tree.feature)
+            threshold[nodes] = tree.threshold
+            children[nodes, 0] = np.where(is_leaf, own, tree.children_left + offset)
+            children[nodes, 1] = np.where(is_leaf, own, tree.children_right + offset)
+            values = tree.value[:, 0, :]
+            leaf_proba[nodes] = values / values.sum(axis=1, keepdims=True)
+
+        max_depth = max(tree.max_depth for tree in trees)
+        return cls(offsets.astype(np.int32), feature, threshold, children.ravel(), leaf_proba,
+                   rf_model.classes_, max_depth)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def _step(self, X_flat, row_offsets, node):
+        # Same float32 input precision as sklearn's tree traversal
+        go_right = X_flat[row_offsets + self._feature[node]] > self.threshold[node]
+        return self._children[2 * node + go_right]
+
+    # Leaf index reached in every tree, shape (n_rows, n_trees). All trees advance
+    # one level per step, so a single row costs max_depth vectorized steps.
+    def apply(self, X):
+        X = np.ascontiguousarray(np.atleast_2d(X), dtype=np.float32)
+        row_offsets = (np.arange(len(X)) * X.shape[1])[:, None]
+        node = np.broadcast_to(self.roots.astype(np.intp), (len(X), self.n_trees))
+        for _ in range(self.max_depth):
+            node = self._step(X.ravel(), row_offsets, node)
+        return node
+
+    def predict_proba(self, X):
+        X = np.ascontiguousarray(np.atleast_2d(X), dtype=np.float32)
+        if len(X) <= TRAVERSE_BLOCK_ROWS:
+            return self.leaf_proba[self.apply(X)].mean(axis=1)
+
+        # Large batches: one tree at a time keeps the working set to a few
+        # (n_rows,) vectors instead of an (n_rows, n_trees) matrix
+        row_offsets = np.arange(len(X)) * X.shape[1]
+        proba = np.zeros((len(X), len(self.classes_)))
+        for root in self.roots:
+            node = np.full(len(X), root, dtype=np.intp)
+            for _ in range(self.max_depth):
+                node = self._step(X.ravel(), row_offsets, node)
+            proba += self.leaf_proba[node]
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    # Single file: magic, header length, JSON header, then 64-byte aligned raw arrays
+    def save(self, path):
+        header = {'classes': [str(c) for c in self.classes_], 'max_depth': self.max_depth, 'arrays': {}}
+        offset = 0
+        for name in self.ARRAYS:
+            array = np.ascontiguousarray(getattr(self, name))
+            offset = -(-offset // FOREST_ALIGN) * FOREST_ALIGN
+            header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset += array.nbytes
+        encoded = json.dumps(header).encode('utf-8')
+        data_start = -(-(len(FOREST_MAGIC) + 8 + len(encoded)) // FOREST_ALIGN) * FOREST_ALIGN
+
+        with open(path, 'wb') as f:
+            f.write(FOREST_MAGIC)
+            f.write(len(encoded).to_bytes(8, 'little'))
+            f.write(encoded)
+            for name in self.ARRAYS:
+                f.seek(data_start + header['arrays'][name]['offset'])
+                f.write(np.ascontiguousarray(getattr(self, name)).tobytes())
+
+    # With mmap=True the arrays are read-only views of the file's pages, shared
+    # by every worker process that loads the same file
+    @classmethod
+    def load(cls, path, mmap=True):
+        with open(path, 'rb') as f:
+            if f.read(len(FOREST_MAGIC)) != FOREST_MAGIC:
+                raise ValueError(f"'{path}' is not a compiled forest file")
+            header_len = int.from_bytes(f.read(8), 'little')
+            header = json.loads(f.read(header_len))
+        data_start = -(-(len(FOREST_MAGIC) + 8 + header_len) // FOREST_ALIGN) * FOREST_ALIGN
+
+        arrays = {}
+        for name in cls.ARRAYS:
+            spec = header['arrays'][name]
+            dtype = np.dtype(spec['dtype'])
+            shape = tuple(spec['shape'])
+            if mmap:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', shape=shape,
+                                         offset=data_start + spec['offset'])
+            else:
+                count = int(np.prod(shape))
+                arrays[name] = np.fromfile(path, dtype=dtype, count=count,
+                                           offset=data_start + spec['offset']).reshape(shape)
+        return cls(classes=header['classes'], max_depth=header['max_depth'], **arrays)
+
+
+# Precompiled predictor: inputs go through weigh + standardize with the
+# weights and scaler kept as arrays, and the forest is evaluated without
+# sklearn's per-call validation and joblib dispatch. Small
+# batches (form submits, micro-batches) use the compiled array forest; larger
+# ones walk the sklearn trees, whose Cython traversal wins at that size, and
+# read leaf probabilities from the compiled forest (tree i's node n is its node
+# roots[i] + n), so no other copy of them is kept.
+# Results match rf_model.predict_proba on the weighted, scaled input.
+class FastPredictor:
+    def __init__(self, rf_model, scaler, feature_cols, feature_weights, forest=None):
+        self.weights = np.sqrt([feature_weights.get(col, 1.0) for col in feature_cols]).astype(np.float32)
+        self.mean = np.asarray(scaler.mean_, dtype=np.float64)
+        self.scale = np.asarray(scaler.scale_, dtype=np.float64)
+        self.feature_cols = list(feature_cols)
+        self.classes_ = rf_model.classes_
+        self.trees = [estimator.tree_ for estimator in rf_model.estimators_]
+        self.forest = forest if forest is not None else CompiledForest.from_sklearn(rf_model)
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        forest = None
+        if artifact.get('forest_path'):
+            forest = CompiledForest.load(artifact['forest_path'])
+        return cls(artifact['model'], artifact['scaler'],
+                   artifact['feature_cols'], artifact['feature_weights'], forest)
+
+    # Raw feature rows (in feature_cols order) -> model input
+    def transform(self, X):
+        X = weigh(np.reshape(X, (-1, len(self.weights))), self.weights)
+        return standardize(X, self.mean, self.scale, out=X)
+
+    def predict_proba(self, X):
+        with SPANS.span('predict.transform'):
+            X = self.transform(X)
+        with SPANS.span('predict.forest'):
+            if len(X) <= TRAVERSE_BLOCK_ROWS:
+                return self.forest.predict_proba(X)
+            proba = np.zeros((X.shape[0], len(self.classes_)))
+            leaf_proba = self.forest.leaf_proba
+            for tree, root in zip(self.trees, self.forest.roots):
+                proba += leaf_proba[root + tree.apply(X)]
+            proba /= len(self.trees)
+            return proba
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    # Single form submission: dict of feature name -> value
+    def predict_one(self, inputs):
+        proba = self.predict_proba([inputs[col] for col in self.feature_cols])[0]
+        return self.classes_[proba.argmax()], proba
@@ -0,0 +1,240 @@
+# Precomputed probability lookup table over the form's core input grid
+#
+#   python lookup_table.py            # build the table for the latest trained model
+#
+# The high-weight inputs are discrete in the form (Gender, Academic Level,
+# Sleep Duration in 0.5 h steps, Quality of Sleep, Stress Level, BMI Category),
+# so every combination is scored once. The continuous vitals are binned and
+# each bin is scored at a representative value, which makes the table an
+# approximation: the build measures its error against the exact forest on
+# random form inputs and stores it alongside the table. Requests outside the
+# grid return None and should use the exact path. A table that fails any of
+# the LOOKUP_* bounds (mean and worst-case probability error, agreement with
+# the forest's label) is kept for inspection but never loaded for serving.
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+# Exact axes: feature -> every value the form can produce
+GRID_AXES = [
+    ('Gender', [0, 1]),
+    ('Academic Level', [0, 1, 2, 3]),
+    ('Sleep Duration', list(np.arange(3.0, 12.5, 0.5))),
+    ('Quality of Sleep', list(range(1, 11))),
+    ('Stress Level', list(range(1, 11))),
+    ('BMI Category', [0, 1, 2]),
+]
+
+# Binned axes: feature -> (bin edges over the form range, value scored for each bin)
+BINNED_AXES = [
+    ('Physical Activity Level', [0, 30, 60, 90, 150], [15, 45, 75, 110]),
+    ('Heart Rate (bpm)', [40, 80, 130], [70, 95]),
+    ('Systolic BP', [80, 130, 200], [118, 145]),
+    ('Age', [16, 80], [25]),
+    ('Daily Steps', [1000, 20000], [7000]),
+    ('Diastolic BP', [50, 130], [80]),
+]
+
+# Probabilities are stored as uint16 fractions of this scale
+PROBA_SCALE = 65535
+
+# Largest acceptable mean absolute probability error on the validation sample
+LOOKUP_TOLERANCE = 0.05
+
+# Largest acceptable single-probability error on the validation sample
+LOOKUP_MAX_ERROR = 0.1
+
+# Smallest acceptable share of validation inputs given the forest's label
+LOOKUP_MIN_AGREEMENT = 0.995
+
+# Random form inputs used to measure the table's error
+VALIDATION_SAMPLES = 20000
+
+
+def _axes():
+    axes = [(col, np.asarray(values, dtype=np.float64)) for col, values in GRID_AXES]
+    axes += [(col, np.asarray(reps, dtype=np.float64)) for col, _, reps in BINNED_AXES]
+    return axes
+
+
+# Uniform random inputs over the form's widget ranges and steps
+def random_form_inputs(n, seed=0):
+    rng = np.random.RandomState(seed)
+    return {
+        'Gender': rng.randint(0, 2, n),
+        'Age': rng.randint(16, 81, n),
+        'Academic Level': rng.randint(0, 4, n),
+        'Sleep Duration': rng.randint(6, 25, n) * 0.5,
+        'Quality of Sleep': rng.randint(1, 11, n),
+        'Physical Activity Level': rng.randint(0, 151, n),
+        'Stress Level': rng.randint(1, 11, n),
+        'BMI Category': rng.randint(0, 3, n),
+        'Heart Rate (bpm)': rng.randint(40, 131, n),
+        'Daily Steps': rng.randint(1000, 20001, n),
+        'Systolic BP': rng.randint(80, 201, n),
+        'Diastolic BP': rng.randint(50, 131, n),
+    }
+
+
+# Reasons a table with this measured error may not be served (empty if it may)
+def unusable_reasons(accuracy):
+    reasons = []
+    if accuracy['mean_abs_error'] > LOOKUP_TOLERANCE:
+        reasons.append(f"mean error {accuracy['mean_abs_error']:.4f} > {LOOKUP_TOLERANCE}")
+    if accuracy.get('max_abs_error', 1.0) > LOOKUP_MAX_ERROR:
+        reasons.append(f"max error {accuracy.get('max_abs_error', 1.0):.4f} > {LOOKUP_MAX_ERROR}")
+    if accuracy.get('label_agreement', 0.0) < LOOKUP_MIN_AGREEMENT:
+        reasons.append(f"label agreement {accuracy.get('label_agreement', 0.0):.2%} < {LOOKUP_MIN_AGREEMENT:.1%}")
+    return reasons
+
+
+class LookupTable:
+    def __init__(self, table, feature_cols, model_version, accuracy):
+        self.table = table                  # (*axis sizes, n_classes) uint16
+        self.feature_cols = list(feature_cols)
+        self.model_version = model_version
+        self.accuracy = accuracy            # error of the table vs the exact forest
+        self.usable = not unusable_reasons(accuracy)
+
+        axes = _axes()
+        self._positions = [self.feature_cols.index(col) for col, _ in axes]
+        self._exact = [{float(v): i for i, v in enumerate(values)} for _, values in GRID_AXES]
+        self._edges = [np.asarray(edges, dtype=np.float64) for _, edges, _ in BINNED_AXES]
+
+    # Score every grid cell with `predictor` (a FastPredictor) in bulk
+    @classmethod
+    def build(cls, predictor, model_version, block_rows=100000):
+        axes = _axes()
+        shape = tuple(len(values) for _, values in axes)
+        n_classes = len(predictor.classes_)
+        table = np.empty((int(np.prod(shape)), n_classes), dtype=np.uint16)
+
+        positions = [predictor.feature_cols.index(col) for col, _ in axes]
+        for start in range(0, len(table), block_rows):
+            cells = np.arange(start, min(start + block_rows, len(table)))
+            X = np.empty((len(cells), len(predictor.feature_cols)))
+            for axis, index in enumerate(np.unravel_index(cells, shape)):
+                X[:, positions[axis]] = axes[axis][1][index]
+            table[cells] = np.rint(predictor.predict_proba(X) * PROBA_SCALE)
+
+        lookup = cls(table.reshape(shape + (n_classes,)), predictor.feature_cols, model_version,
+                     {'mean_abs_error': 0.0})
+        lookup.accuracy = lookup.measure_error(predictor)
+        lookup.usable = not unusable_reasons(lookup.accuracy)
+        return lookup
+
+    # Table index for one feature row, or None if it falls outside the grid
+    def _index(self, values):
+        index = []
+        for axis, exact in enumerate(self._exact):
+            i = exact.get(float(values[self._positions[axis]]))
+            if i is None:
+                return None
+            index.append(i)
+        for axis, edges in enumerate(self._edges):
+            value = float(values[self._positions[len(self._exact) + axis]])
+            if value < edges[0] or value > edges[-1]:
+                return None
+            index.append(min(int(np.searchsorted(edges, value, side='right')) - 1, len(edges) - 2))
+        return tuple(index)
+
+    # O(1) class probabilities for a row in feature_cols order, or None
+    def lookup(self, values):
+        if not self.usable:
+            return None
+        index = self._index(values)
+        if index is None:
+            return None
+        return self.table[index] / PROBA_SCALE
+
+    def measure_error(self, predictor, n=VALIDATION_SAMPLES, seed=0):
+        inputs = random_form_inputs(n, seed)
+        X = np.column_stack([inputs[col] for col in self.feature_cols]).astype(np.float64)
+        exact = predictor.predict_proba(X)
+        approx = np.array([self.table[self._index(row)] for row in X]) / PROBA_SCALE
+        error = np.abs(approx - exact)
+        return {
+            'samples': n,
+            'mean_abs_error': float(error.mean()),
+            'p99_abs_error': float(np.percentile(error.max(axis=1), 99)),
+            'max_abs_error': float(error.max()),
+            'label_agreement': float((approx.argmax(axis=1) == exact.argmax(axis=1)).mean()),
+        }
+
+    # Both files are written under temp names and renamed into place, the
+    # .json last: readers only look for the table once its .json exists
+    def save(self, path):
+        tmp_suffix = f'.tmp-{os.getpid()}-{threading.get_ident()}'
+        try:
+            with open(path + '.npy' + tmp_suffix, 'wb') as f:
+                np.save(f, self.table)
+            with open(path + '.json' + tmp_suffix, 'w') as f:
+                json.dump({'model_version': self.model_version, 'feature_cols': self.feature_cols,
+                           'shape': list(self.table.shape), 'accuracy': self.accuracy,
+                           'tolerance': LOOKUP_TOLERANCE, 'max_error': LOOKUP_MAX_ERROR,
+                           'min_agreement': LOOKUP_MIN_AGREEMENT}, f, indent=2)
+            os.replace(path + '.npy' + tmp_suffix, path + '.npy')
+            os.replace(path + '.json' + tmp_suffix, path + '.json')
+        finally:
+            for tmp_path in (path + '.npy' + tmp_suffix, path + '.json' + tmp_suffix):
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    # The table is memory-mapped, so workers share one copy through the page cache
+    @classmethod
+    def load(cls, path):
+        with open(path + '.json') as f:
+            meta = json.load(f)
+        table = np.load(path + '.npy', mmap_mode='r')
+        return cls(table, meta['feature_cols'], meta['model_version'], meta['accuracy'])
+
+
+def lookup_table_path(model_version, model_dir):
+    return os.path.join(model_dir, f'sleep_model-{model_version}.lut')
+
+
+# True once a table (usable or not) has been saved for this model version
+def lookup_table_built(model_version, model_dir):
+    return os.path.exists(lookup_table_path(model_version, model_dir) + '.json')
+
+
+# Table for this artifact if one has been built and passes its bounds, else None
+def load_lookup_table(artifact, model_dir):
+    if not lookup_table_built(artifact['key'], model_dir):
+        return None
+    lookup = LookupTable.load(lookup_table_path(artifact['key'], model_dir))
+    if lookup.model_version != artifact['key'] or not lookup.usable:
+        return None
+    return lookup
+
+
+def main(argv=None):
+    from sleep_model import MODEL_DIR, load_latest_artifact
+    from inference import FastPredictor
+
+    parser = argparse.ArgumentParser(description="Precompute the probability lookup table for the latest model.")
+    parser.add_argument('--model-dir', default=MODEL_DIR)
+    args = parser.parse_args(argv)
+
+    artifact = load_latest_artifact(args.model_dir)
+    start = time.perf_counter()
+    lookup = LookupTable.build(FastPredictor.from_artifact(artifact), artifact['key'])
+    path = lookup_table_path(artifact['key'], args.model_dir)
+    lookup.save(path)
+
+    cells = int(np.prod(lookup.table.shape[:-1]))
+    print(f"Built {cells:,} cells ({lookup.table.nbytes / 1e6:.1f} MB) in {time.perf_counter() - start:.1f}s -> {path}.npy")
+    for name, value in lookup.accuracy.items():
+        print(f"  {name:<16} {value}")
+    if not lookup.usable:
+        print(f"The table will not be used: {'; '.join(unusable_reasons(lookup.accuracy))}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+# Hot-swappable serving model
+#
+# A ModelHandle owns what a process serves from: the artifact, its
+# FastPredictor and its lookup table. A daemon thread polls the model store's
+# LATEST pointer; when `train.py` or `incremental.py` publishes a new artifact
+# it is loaded and compiled off the request path and then swapped in with a
+# single reference assignment. Callers take `handle.current()` once per request
+# and keep using that bundle, so in-flight predictions finish on the model they
+# started with and nothing waits for a reload.
+import collections
+import os
+import threading
+import time
+
+from sleep_model import MODEL_DIR, latest_key, load_artifact
+from inference import FastPredictor
+from lookup_table import load_lookup_table, lookup_table_built
+from telemetry import SPANS, log_event, logger
+
+# Seconds between checks of the LATEST pointer (0 disables reloading)
+RELOAD_SECONDS = float(os.environ.get('SLEEP_RELOAD_SECONDS', '5'))
+
+ServingModel = collections.namedtuple('ServingModel', ['artifact', 'predictor', 'lookup_table'])
+
+
+class ModelHandle:
+    def __init__(self, artifact, model_dir=MODEL_DIR, reload_seconds=RELOAD_SECONDS):
+        self.model_dir = model_dir
+        self.reloads = 0
+        self._current = self._load(artifact)
+        self._table_built = lookup_table_built(artifact['key'], model_dir)
+        # Key being served: a LATEST pointer to any other artifact (including
+        # one published before startup) is swapped in on the next check
+        self._published = artifact['key']
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._worker = None
+        if reload_seconds:
+            self._worker = threading.Thread(target=self._run, args=(reload_seconds,),
+                                            name='model-reload', daemon=True)
+            self._worker.start()
+
+    def _load(self, artifact):
+        return ServingModel(artifact, FastPredictor.from_artifact(artifact),
+                            load_lookup_table(artifact, self.model_dir))
+
+    def current(self):
+        return self._current
+
+    # Swap in a newly published artifact; returns True if the model changed
+    def check(self):
+        key = latest_key(self.model_dir)
+        if key is None or key == self._published:
+            self._check_lookup_table()
+            return False
+        with self._lock:
+            if key == self._published:
+                return False
+            start = time.perf_counter()
+            artifact = load_artifact(key, self.model_dir)
+            if artifact is None:
+                return False
+            previous = self._current.artifact['key']
+            self._current = self._load(artifact)
+            self._table_built = lookup_table_built(key, self.model_dir)
+            self._published = key
+            self.reloads += 1
+        SPANS.record_since('model.reload', start)
+        log_event('model.swap', previous=previous, key=key)
+        return True
+
+    # A lookup table can be built after its model was published (`python
+    # lookup_table.py`): keep looking for it until one exists for the served key
+    def _check_lookup_table(self):
+        if self._table_built:
+            return
+        with self._lock:
+            serving = self._current
+            if self._table_built or not lookup_table_built(serving.artifact['key'], self.model_dir):
+                return
+            self._table_built = True
+            lookup = load_lookup_table(serving.artifact, self.model_dir)
+            if lookup is not None:
+                self._current = serving._replace(lookup_table=lookup)
+                log_event('model.lookup_table', key=serving.artifact['key'])
+
+    def _run(self, reload_seconds):
+        while not self._stop.wait(reload_seconds):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Model reload failed; still serving %s", self._current.artifact['key'])
+
+    def close(self):
+        self._stop.set()
+        if self._worker is not None:
+            self._worker.join()
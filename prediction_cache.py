@@ -0,0 +1,95 @@
+# Bounded LRU + TTL cache for prediction results
+#
+# Every form input is discrete (integer sliders, 0.5 h sleep steps, fixed
+# selectbox options), so identical feature vectors are common. Entries are keyed
+# on the canonical feature tuple plus the model version; when a different model
+# version shows up the whole cache is dropped, so a retrain never serves stale
+# probabilities.
+import collections
+import threading
+import time
+
+# Default capacity and entry lifetime
+CACHE_MAXSIZE = 10000
+CACHE_TTL_SECONDS = 3600.0
+
+
+# Hashable, order-stable key: floats rounded so 7.5 and 7.500000001 collide
+def canonical_key(values):
+    return tuple(round(float(v), 6) for v in values)
+
+
+class PredictionCache:
+    def __init__(self, maxsize=CACHE_MAXSIZE, ttl_seconds=CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.model_version = None
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _check_version(self, model_version):
+        if model_version != self.model_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.model_version = model_version
+
+    def get(self, values, model_version):
+        key = canonical_key(values)
+        with self._lock:
+            self._check_version(model_version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            if self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, values, model_version, value):
+        key = canonical_key(values)
+        with self._lock:
+            self._check_version(model_version)
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    # Cached value for `values`, computing (outside the lock) and storing it on a miss
+    def get_or_compute(self, values, model_version, compute):
+        value = self.get(values, model_version)
+        if value is None:
+            value = compute()
+            self.put(values, model_version, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'model_version': self.model_version,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
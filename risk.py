@@ -0,0 +1,68 @@
+# Lifestyle risk score and risk tier, for one student or a whole cohort
+#
+# The score adds up stress, poor sleep quality, missing physical activity,
+# academic level and distance from 8 hours of sleep, then scales the sum by an
+# academic-level multiplier. Tiers use thresholds that drop by 5 points per
+# academic level. Inputs are array-likes of any length (scalars work too);
+# `Academic Level` is the model code 0-3, as in the encoded feature frame.
+import numpy as np
+import pandas as pd
+
+# Columns the score is computed from
+RISK_COLUMNS = ['Stress Level', 'Quality of Sleep', 'Physical Activity Level', 'Academic Level', 'Sleep Duration']
+
+# Academic multiplier shows clear risk increase: 0.7x, 1.0x, 1.4x, 1.9x
+ACADEMIC_MULTIPLIERS = np.array([0.7, 1.0, 1.4, 1.9])
+
+# Tier thresholds at academic level 0, each lowered by 5 points per level
+TIER_THRESHOLDS = np.array([40.0, 70.0, 100.0])
+THRESHOLD_STEP = 5.0
+
+RISK_TIERS = ['Low Risk', 'Moderate Risk', 'High Risk', 'Very High Risk']
+
+RISK_SCORE_COL = 'Risk Score'
+RISK_TIER_COL = 'Risk Tier'
+
+
+def _academic_level(academic_level):
+    level = np.asarray(academic_level)
+    if level.size and (level.min() < 0 or level.max() >= len(ACADEMIC_MULTIPLIERS)):
+        raise ValueError(f"Academic Level codes must be 0-{len(ACADEMIC_MULTIPLIERS) - 1}")
+    return level.astype(np.intp)
+
+
+# Risk scores as float64. Inputs are widened first: the compact int8/int16
+# columns of the data cache would overflow on the weighted terms.
+def risk_scores(stress, quality, activity, academic_level, duration):
+    level = _academic_level(academic_level)
+    stress = np.asarray(stress, dtype=np.float64)
+    quality = np.asarray(quality, dtype=np.float64)
+    activity = np.asarray(activity, dtype=np.float64)
+    duration = np.asarray(duration, dtype=np.float64)
+    # Same term order as the original scalar formula, so results match it exactly
+    base_total = (stress * 10 + (11 - quality) * 8 + np.maximum(0, 60 - activity) * 5
+                  + (level + 1) * 5.0 + np.abs(8 - duration) * 4)
+    return base_total * ACADEMIC_MULTIPLIERS[level]
+
+
+# Tier index 0-3 (see RISK_TIERS) for each score: the number of the level's
+# thresholds it reaches
+def risk_tiers(scores, academic_level):
+    scores = np.asarray(scores, dtype=np.float64)
+    thresholds = TIER_THRESHOLDS - _academic_level(academic_level)[..., None] * THRESHOLD_STEP
+    return (scores[..., None] >= thresholds).sum(axis=-1).astype(np.int8)
+
+
+# (scores, tiers) for every row of an encoded feature frame
+def score_frame(df):
+    missing = [col for col in RISK_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"Risk score needs columns: {', '.join(missing)}")
+    stress, quality, activity, level, duration = (df[col].to_numpy() for col in RISK_COLUMNS)
+    scores = risk_scores(stress, quality, activity, level, duration)
+    return scores, risk_tiers(scores, level)
+
+
+# Tier names for tier indices, as a categorical column
+def tier_labels(tiers):
+    return pd.Categorical.from_codes(tiers, categories=RISK_TIERS, ordered=True)
@@ -1,17 +1,23 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.metrics import classification_report, accuracy_score, confusion_matrix
-from imblearn.over_sampling import SMOTE
-import plotly.express as px
+import os
+import time
+from sleep_model import DATA_PATH, MODEL_DIR, N_JOBS, load_evaluation, load_latest_artifact, load_or_train_model
+from batch_predict import PREDICTION_COL, predict_batch, read_table
+from batching import RESULT_TIMEOUT_SECONDS, MicroBatcher
+from model_reload import ModelHandle
+from prediction_cache import PredictionCache
+from risk import risk_scores, risk_tiers
+from telemetry import SPANS, logger
 import warnings
 warnings.filterwarnings('ignore')
 
+# Per-stage timings for this rerun (shown by the ?debug=1 panel) and for the
+# process-wide histograms
+rerun_start = time.perf_counter()
+SPANS.start_trace()
+
 # Set page config - Force Light Theme
 st.set_page_config(
     page_title="Sleep Disorder Prediction App",
@@ -21,6 +27,7 @@ st.set_page_config(
 )
 
 # Premium Light Theme with Enhanced Styling
+css_start = time.perf_counter()
 st.markdown("""
 <style>
     /* Ultimate light theme enforcement with premium aesthetics */
@@ -546,207 +553,80 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 st.markdown("---")
+SPANS.record_since('render.css', css_start)
 
-# Load data function with all 13 features
-@st.cache_data
-def load_data():
-    try:
-        # Try to load the data file
-        df = pd.read_excel('scoring_sleep.xlsx')
-        
-        # Encode categorical variables only if they exist
-        le_gender = LabelEncoder()
-        
-        # Check which columns exist and encode accordingly
-        if 'Gender' in df.columns:
-            df['Gender'] = le_gender.fit_transform(df['Gender'])
-        
-        if 'Academic Level' in df.columns:
-            le_academic = LabelEncoder()
-            df['Academic Level'] = le_academic.fit_transform(df['Academic Level'])
-        
-        if 'BMI Category' in df.columns:
-            le_bmi = LabelEncoder()
-            df['BMI Category'] = le_bmi.fit_transform(df['BMI Category'])
-        
-        return df
-    except FileNotFoundError:
-        # If file not found, create comprehensive sample data with all 13 features
-        np.random.seed(42)
-        n_samples = 500
-        
-        data = {
-            'Person ID': range(1, n_samples + 1),
-            'Gender': np.random.choice([0, 1], n_samples),  # 0: Female, 1: Male
-            'Age': np.random.randint(18, 65, n_samples),
-            'Academic Level': np.random.choice([0, 1, 2, 3], n_samples),  # 0-3 for Level 1-4
-            'Sleep Duration': np.random.normal(7, 1.5, n_samples).clip(3, 12),
-            'Quality of Sleep': np.random.randint(1, 11, n_samples),
-            'Physical Activity Level': np.random.randint(15, 120, n_samples),
-            'Stress Level': np.random.randint(1, 11, n_samples),
-            'BMI Category': np.random.choice([0, 1, 2], n_samples),  # 0: Normal, 1: Overweight, 2: Obese
-            'Heart Rate (bpm)': np.random.randint(55, 110, n_samples),
-            'Daily Steps': np.random.randint(2000, 15000, n_samples),
-            'Systolic BP': np.random.randint(100, 160, n_samples),
-            'Diastolic BP': np.random.randint(60, 100, n_samples)
-        }
-        
-        # Create sleep disorders with clear academic level risk progression
-        sleep_disorders = []
-        for i in range(n_samples):
-            stress_score = data['Stress Level'][i] * 5.0  # Highest weight - 50%
-            sleep_quality_score = (11 - data['Quality of Sleep'][i]) * 3.0  # Second highest - 30% 
-            activity_score = max(0, 60 - data['Physical Activity Level'][i]) * 2.0  # Third - 2
-            
-            # Academic level risk increases progressively: Level 0=minimal, Level 3=maximum
-            academic_level_risk = data['Academic Level'][i] * 3.0  # 0, 3, 6, 9, 12 progression
-            duration_score = abs(8 - data['Sleep Duration'][i]) * 1.0  # Fifth - 10%
-            
-            # Other factors have lower weights
-            bp_score = max(0, data['Systolic BP'][i] - 120) * 0.5  # 5%
-            hr_score = max(0, data['Heart Rate (bpm)'][i] - 80) * 0.3  # 3%
-            bmi_score = data['BMI Category'][i] * 0.5  # 5%
-            steps_score = max(0, 8000 - data['Daily Steps'][i]) * 0.0002  # 2%
-            age_score = max(0, data['Age'][i] - 40) * 0.2  # 2%
-            gender_score = data['Gender'][i] * 0.1  # 1%
-            
-            base_risk_score = (stress_score + sleep_quality_score + activity_score + 
-                              academic_level_risk + duration_score + bp_score + hr_score + 
-                              bmi_score + steps_score + age_score + gender_score)
-            
-            # Academic level multiplier: Level 0=0.5x, Level 1=0.8x, Level 2=1.2x, Level 3=1.8x
-            academic_multipliers = [0.5, 0.8, 1.2, 1.8]  # Progressive risk increase
-            academic_multiplier = academic_multipliers[data['Academic Level'][i]]
-            total_risk_score = base_risk_score * academic_multiplier
-            
-            # Risk thresholds adjusted for academic levels
-            high_risk_threshold = 25 - (data['Academic Level'][i] * 3)  # Lower threshold for higher levels
-            medium_risk_threshold = 15 - (data['Academic Level'][i] * 2)
-            
-            if total_risk_score > high_risk_threshold and data['Stress Level'][i] >= (7 - data['Academic Level'][i]):
-                # Higher academic levels develop disorders with lower stress
-                if data['Academic Level'][i] >= 3:  # Level 4 (Expert)
-                    sleep_disorders.append('Insomnia' if np.random.random() < 0.9 else 'Sleep Apnea')
-                elif data['Academic Level'][i] >= 2:  # Level 3 (Advanced)
-                    sleep_disorders.append('Insomnia' if np.random.random() < 0.8 else 'Sleep Apnea')
-                elif data['Academic Level'][i] >= 1:  # Level 2 (Intermediate)
-                    if data['Heart Rate (bpm)'][i] > 85 or data['Systolic BP'][i] > 140:
-                        sleep_disorders.append('Sleep Apnea' if np.random.random() < 0.6 else 'Insomnia')
-                    else:
-                        sleep_disorders.append('Insomnia')
-                else:  # Level 1 (Basic) - lowest risk
-                    if data['Stress Level'][i] >= 8 and data['Heart Rate (bpm)'][i] > 90:
-                        sleep_disorders.append('Sleep Apnea')
-                    else:
-                        sleep_disorders.append('None')  # Often no disorder for basic level
-            elif total_risk_score > medium_risk_threshold:
-                # Medium risk - academic level influences disorder probability
-                disorder_probabilities = [0.1, 0.3, 0.6, 0.8]  # Level 0-3 disorder chances
-                disorder_chance = disorder_probabilities[data['Academic Level'][i]]
-                
-                if np.random.random() < disorder_chance:
-                    if data['Academic Level'][i] >= 2:  # Advanced levels prefer insomnia
-                        sleep_disorders.append('Insomnia')
-                    elif data['Academic Level'][i] == 1:  # Intermediate - mixed
-                        sleep_disorders.append('Insomnia' if np.random.random() < 0.7 else 'Sleep Apnea')
-                    else:  # Basic level - mostly none
-                        sleep_disorders.append('None' if np.random.random() < 0.7 else 'Sleep Apnea')
-                else:
-                    sleep_disorders.append('None')
-            else:
-                # Low risk - but higher academic levels can still develop issues
-                low_risk_probabilities = [0.02, 0.08, 0.15, 0.25]  # Even low risk varies by level
-                if np.random.random() < low_risk_probabilities[data['Academic Level'][i]]:
-                    if data['Academic Level'][i] >= 3 and data['Stress Level'][i] >= 5:
-                        sleep_disorders.append('Insomnia')
-                    elif data['Academic Level'][i] >= 2 and data['Stress Level'][i] >= 6:
-                        sleep_disorders.append('Insomnia' if np.random.random() < 0.8 else 'None')
-                    else:
-                        sleep_disorders.append('None')
-                else:
-                    sleep_disorders.append('None')
-        
-        data['Sleep Disorder'] = sleep_disorders
-        
-        return pd.DataFrame(data)
+# Load the trained model once per worker process; the on-disk artifact store
+# means only the first process for a given dataset/parameter set actually trains.
+# With SLEEP_SERVE_ONLY=1 workers only load what `python train.py` published.
+SERVE_ONLY = os.environ.get('SLEEP_SERVE_ONLY') == '1'
 
-# Train model function with weighted features
-@st.cache_data
-def train_model(df):
-    # Feature importance weights based on requirements
-    feature_weights = {
-        'Stress Level': 4.5,          # Highest importance (50%)
-        'Quality of Sleep': 3.5,      # Second highest (30%)
-        'Physical Activity Level': 2.5, # Third (20%)
-        'Academic Level': 2.0,        # Progressive risk: Level 0=low, Level 3=high (25%)
-        'Sleep Duration': 1.0,        # Fifth (10%)
-        'Systolic BP': 0.5,          # Lower importance (5%)
-        'BMI Category': 0.5,         # Lower importance (5%)
-        'Heart Rate (bpm)': 0.3,     # Lower importance (3%)
-        'Diastolic BP': 0.2,         # Lower importance (2%)
-        'Daily Steps': 0.2,          # Lower importance (2%)
-        'Age': 0.2,                  # Lower importance (2%)
-        'Gender': 0.1                # Lowest importance (1%)
-    }
-    
-    # Prepare features and target - use only available columns
-    potential_features = ['Gender', 'Age', 'Academic Level', 'Sleep Duration',
-                         'Quality of Sleep', 'Physical Activity Level', 'Stress Level',
-                         'BMI Category', 'Heart Rate (bpm)', 'Daily Steps', 'Systolic BP',
-                         'Diastolic BP']
-    
-    # Use only available columns from the dataset
-    available_features = [col for col in potential_features if col in df.columns]
-    X = df[available_features]
-    y = df['Sleep Disorder']
-    
-    # Apply feature weights to scale the importance
-    X_weighted = X.copy()
-    for col in X_weighted.columns:
-        if col in feature_weights:
-            # Apply square root to moderate the effect while preserving importance
-            weight = np.sqrt(feature_weights[col])
-            X_weighted[col] = X_weighted[col] * weight
-    
-    # Train-test split
-    X_train, X_test, y_train, y_test = train_test_split(X_weighted, y, test_size=0.2, 
-                                                        random_state=42, stratify=y)
-    
-    # Apply SMOTE to handle class imbalance
-    smote = SMOTE(random_state=42, k_neighbors=min(3, len(X_train)-1))
-    X_train_smote, y_train_smote = smote.fit_resample(X_train, y_train)
-    
-    # Scale features
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train_smote)
-    X_test_scaled = scaler.transform(X_test)
-    
-    # Train enhanced Random Forest model with optimized parameters
-    rf_model = RandomForestClassifier(
-        n_estimators=200,           # More trees for better performance
-        max_depth=15,               # Control overfitting
-        min_samples_split=5,        # Prevent overfitting
-        min_samples_leaf=2,         # Prevent overfitting
-        random_state=42,
-        class_weight='balanced'     # Handle class imbalance
-    )
-    rf_model.fit(X_train_scaled, y_train_smote)
-    
-    # Make predictions
-    y_pred = rf_model.predict(X_test_scaled)
-    
-    # Calculate accuracy
-    accuracy = accuracy_score(y_test, y_pred)
-    
-    # Get feature importance
-    feature_importance = dict(zip(X_weighted.columns, rf_model.feature_importances_))
-    
-    return (rf_model, scaler, X_weighted.columns.tolist(), accuracy, y_test, y_pred, 
-            X_train, X_test, feature_importance, feature_weights)
+@st.cache_resource
+def get_model_artifact():
+    if SERVE_ONLY:
+        return load_latest_artifact()
+    return load_or_train_model(DATA_PATH)
+
+# Serving model (artifact, compiled predictor, lookup table) that is swapped in
+# place whenever a newer artifact is published, e.g. by `incremental.py`
+@st.cache_resource
+def get_model_handle():
+    return ModelHandle(get_model_artifact(), MODEL_DIR)
 
 # Load data and train model
-df = load_data()
-rf_model, scaler, feature_cols, model_accuracy, y_test, y_pred, X_train, X_test, feature_importance, feature_weights = train_model(df)
+try:
+    model_handle = get_model_handle()
+except FileNotFoundError as e:
+    st.error(str(e))
+    st.stop()
+# One consistent bundle for this whole rerun, even if a swap happens meanwhile
+serving_model = model_handle.current()
+artifact = serving_model.artifact
+rf_model = artifact['model']
+scaler = artifact['scaler']
+feature_cols = artifact['feature_cols']
+feature_weights = artifact['feature_weights']
+model_accuracy = artifact['metrics']['accuracy']
+feature_importance = artifact['metrics']['feature_importance']
+category_encoder = artifact['encoder']
+
+# Form labels for the spreadsheet's source values of each categorical column
+CATEGORY_LABELS = {
+    'Gender': {0: "Female", 1: "Male"},
+    'Academic Level': {1: "Level 1", 2: "Level 2", 3: "Level 3", 4: "Level 4"},
+    'BMI Category': {1: "Normal", 2: "Overweight", 3: "Obese"},
+}
+
+# Model codes offered by a categorical form field, taken from the schema the
+# model was trained with; unlabelled source values are only offered when none
+# of the values have a label
+def category_options(col):
+    labels = CATEGORY_LABELS.get(col, {})
+    classes = category_encoder.categories[col]
+    return [code for code, value in enumerate(classes) if value in labels] or list(range(len(classes)))
+
+def category_label(col, code):
+    value = category_encoder.decode(col, code)
+    return CATEGORY_LABELS.get(col, {}).get(value, str(value))
+
+# One batcher per process: concurrent sessions submitting at the same moment
+# share a single vectorized forest call, made with the model served right now;
+# a lone submit is scored directly without waiting for a batch window
+@st.cache_resource
+def get_prediction_batcher():
+    handle = get_model_handle()
+    return MicroBatcher(lambda rows: handle.current().predictor.predict_proba(rows))
+
+# Process-wide prediction cache shared by all sessions
+@st.cache_resource
+def get_prediction_cache():
+    return PredictionCache()
+
+fast_predictor = serving_model.predictor
+prediction_batcher = get_prediction_batcher()
+prediction_cache = get_prediction_cache()
+# Optional precomputed probability table (built with `python lookup_table.py`);
+# None unless one was built for this model and passed its accuracy bounds
+lookup_table = serving_model.lookup_table
 
 # Create comprehensive input form
 with st.form("prediction_form"):
@@ -758,13 +638,13 @@ with st.form("prediction_form"):
         st.markdown("#### 👤 Personal Info")
         age = st.number_input("Age", min_value=16, max_value=80, value=25, 
                              help="Your current age")
-        gender = st.selectbox("Gender", options=[0, 1], 
-                            format_func=lambda x: "Female" if x == 0 else "Male")
+        gender = st.selectbox("Gender", options=category_options('Gender'), 
+                            format_func=lambda x: category_label('Gender', x))
         
         st.markdown("#### 🏢 Academic Info")
         academic_level = st.selectbox("Academic Level 🎓", 
-                                    options=[0, 1, 2, 3],
-                                    format_func=lambda x: f"Level {x+1}",
+                                    options=category_options('Academic Level'),
+                                    format_func=lambda x: category_label('Academic Level', x),
                                     help="Level 1: Basic | Level 2: Intermediate | Level 3: Advanced | Level 4: Expert")
     
     with col2:
@@ -788,8 +668,8 @@ with st.form("prediction_form"):
         
         st.markdown("#### ⚖️ Body Metrics")
         bmi_category = st.selectbox("BMI Category", 
-                                  options=[0, 1, 2],
-                                  format_func=lambda x: ["Normal", "Overweight", "Obese"][x])
+                                  options=category_options('BMI Category'),
+                                  format_func=lambda x: category_label('BMI Category', x))
     
     with col4:
         st.markdown("#### ❤️ Health Vitals")
@@ -804,56 +684,45 @@ with st.form("prediction_form"):
     submitted = st.form_submit_button("Predict Sleep Disorder", use_container_width=True)
         
     if submitted:
-        # Prepare input data with all 13 features and apply weights
-        input_data = pd.DataFrame({
-            'Gender': [gender],
-            'Age': [age],
-            'Academic Level': [academic_level],
-            'Sleep Duration': [sleep_duration],
-            'Quality of Sleep': [quality_of_sleep],
-            'Physical Activity Level': [physical_activity],
-            'Stress Level': [stress_level],
-            'BMI Category': [bmi_category],
-            'Heart Rate (bpm)': [heart_rate],
-            'Daily Steps': [daily_steps],
-            'Systolic BP': [systolic_bp],
-            'Diastolic BP': [diastolic_bp]
-        })
-        
-        # Apply the same feature weights as in training
-        input_data_weighted = input_data.copy()
-        for col in input_data_weighted.columns:
-            if col in feature_weights:
-                weight = np.sqrt(feature_weights[col])
-                input_data_weighted[col] = input_data_weighted[col] * weight
-        
-        # Make sure input data has the same features as training data (only available columns)
-        available_input_cols = [col for col in input_data_weighted.columns if col in feature_cols]
-        input_data_final = input_data_weighted[available_input_cols]
-        
-        # Scale the input
-        input_scaled = scaler.transform(input_data_final)
-        
-        # Make prediction
-        prediction = rf_model.predict(input_scaled)[0]
-        prediction_proba = rf_model.predict_proba(input_scaled)[0]
-        
-        # Calculate risk score with clear academic level progression
-        stress_risk = stress_level * 10
-        sleep_quality_risk = (11 - quality_of_sleep) * 8
-        activity_risk = max(0, 60 - physical_activity) * 5
-        
-        # Academic risk progression: Level 1=5, Level 2=10, Level 3=15, Level 4=20
-        academic_base_risk = (academic_level + 1) * 5
-        
-        duration_risk = abs(8 - sleep_duration) * 4
+        # Prepare input data with all 13 features
+        input_values = {
+            'Gender': gender,
+            'Age': age,
+            'Academic Level': academic_level,
+            'Sleep Duration': sleep_duration,
+            'Quality of Sleep': quality_of_sleep,
+            'Physical Activity Level': physical_activity,
+            'Stress Level': stress_level,
+            'BMI Category': bmi_category,
+            'Heart Rate (bpm)': heart_rate,
+            'Daily Steps': daily_steps,
+            'Systolic BP': systolic_bp,
+            'Diastolic BP': diastolic_bp
+        }
         
-        # Academic multiplier shows clear risk increase: 0.7x, 1.0x, 1.4x, 1.9x
-        academic_multipliers = [0.7, 1.0, 1.4, 1.9]
-        academic_multiplier = academic_multipliers[academic_level]
+        # Model probabilities and risk score for this input; identical submissions
+        # are served from the process-wide cache until the model changes
+        def predict_and_score():
+            # Make prediction: O(1) grid lookup when a precomputed table covers this
+            # input, otherwise the forest (weights and scaling folded into the predictor)
+            model_input = [input_values[col] for col in fast_predictor.feature_cols]
+            proba = None
+            if lookup_table is not None:
+                with SPANS.span('predict.lookup'):
+                    proba = lookup_table.lookup(model_input)
+            if proba is None:
+                with SPANS.span('predict.model'):
+                    proba = prediction_batcher.predict_proba(model_input, timeout=RESULT_TIMEOUT_SECONDS)[0]
+            
+            # Risk score with clear academic level progression (same engine as batch scoring)
+            total_risk = risk_scores(stress_level, quality_of_sleep, physical_activity, academic_level,
+                                     sleep_duration)
+            return proba, float(total_risk)
         
-        base_total = stress_risk + sleep_quality_risk + activity_risk + academic_base_risk + duration_risk
-        total_risk = base_total * academic_multiplier
+        with SPANS.span('predict'):
+            prediction_proba, total_risk = prediction_cache.get_or_compute(
+                list(input_values.values()), artifact['key'], predict_and_score)
+        prediction = fast_predictor.classes_[prediction_proba.argmax()]
         
         # Display results
         st.markdown("---")
@@ -883,25 +752,18 @@ with st.form("prediction_form"):
             risk_colors = ["#48bb78", "#d69e2e", "#ed8936", "#e53e3e"]
             
             # Academic level affects risk thresholds
-            thresholds = [40 - (academic_level * 5), 70 - (academic_level * 5), 100 - (academic_level * 5)]
-            
-            if total_risk >= thresholds[2]:
-                risk_level = risk_labels[3]
-                risk_color = risk_colors[3]
-            elif total_risk >= thresholds[1]:
-                risk_level = risk_labels[2] 
-                risk_color = risk_colors[2]
-            elif total_risk >= thresholds[0]:
-                risk_level = risk_labels[1]
-                risk_color = risk_colors[1]
-            else:
-                risk_level = risk_labels[0]
-                risk_color = risk_colors[0]
+            risk_tier = int(risk_tiers(total_risk, academic_level))
+            risk_level = risk_labels[risk_tier]
+            risk_color = risk_colors[risk_tier]
                 
             # Risk assessment section removed as per user request
         
         with col3:
-            # Prediction probabilities chart
+            # Prediction probabilities chart; plotly is only needed once a
+            # prediction is shown, so it stays out of worker startup
+            chart_start = time.perf_counter()
+            import plotly.express as px
+
             classes = rf_model.classes_
             prob_df = pd.DataFrame({
                 'Sleep Disorder': classes,
@@ -935,7 +797,10 @@ with st.form("prediction_form"):
                 plot_bgcolor='rgba(0,0,0,0)',
                 paper_bgcolor='rgba(0,0,0,0)'
             )
-            st.plotly_chart(fig_prob, use_container_width=True)        # Beautiful Health Recommendations System
+            st.plotly_chart(fig_prob, use_container_width=True)
+            SPANS.record_since('render.chart', chart_start)
+        # Beautiful Health Recommendations System
+        recommendations_start = time.perf_counter()
         st.markdown("### 💡 Personalized Health Recommendations")
         
         # Create recommendation categories
@@ -1197,6 +1062,50 @@ with st.form("prediction_form"):
             """, unsafe_allow_html=True)
         
         # Risk Summary section removed as per user request
+        SPANS.record_since('render.recommendations', recommendations_start)
+
+# Batch prediction for whole cohorts
+st.markdown("---")
+st.markdown("### 📁 Batch Prediction")
+st.markdown("Upload a CSV or Excel file with one student per row, using the same category values as the training spreadsheet.")
+
+batch_file = st.file_uploader("Cohort file", type=['csv', 'xlsx', 'parquet'])
+if batch_file is not None:
+    try:
+        batch_df = read_table(batch_file, batch_file.name)
+        batch_results = predict_batch(batch_df, rf_model, scaler, feature_cols, feature_weights, n_jobs=N_JOBS,
+                                      encoder=category_encoder)
+    except ValueError as e:
+        st.error(str(e))
+    else:
+        st.markdown(f"**Scored {len(batch_results):,} rows**")
+        st.dataframe(batch_results[PREDICTION_COL].value_counts().rename('Count'))
+        st.dataframe(batch_results.head(100), use_container_width=True)
+        st.download_button(
+            "Download predictions (CSV)",
+            data=batch_results.to_csv(index=False).encode('utf-8'),
+            file_name='sleep_disorder_predictions.csv',
+            mime='text/csv',
+            use_container_width=True
+        )
+
+# Held-out evaluation of the served model, read from the model store only when
+# someone asks for it and then shared by all sessions
+@st.cache_resource
+def get_model_evaluation(model_key):
+    return load_evaluation(model_key, MODEL_DIR)
+
+st.markdown("---")
+if st.toggle("📊 Show model evaluation"):
+    evaluation = get_model_evaluation(artifact['key'])
+    if evaluation is None:
+        st.info("No held-out evaluation is stored for this model (incrementally updated models have none).")
+    else:
+        st.markdown(f"**Held-out accuracy:** {evaluation['accuracy']:.1%} on {evaluation['n_test']} rows")
+        st.dataframe(pd.DataFrame(evaluation['classification_report']).T.round(3), use_container_width=True)
+        st.markdown("**Confusion matrix** (rows: actual, columns: predicted)")
+        st.dataframe(pd.DataFrame(evaluation['confusion_matrix'], index=evaluation['labels'],
+                                  columns=evaluation['labels']), use_container_width=True)
 
 # Footer
 st.markdown("---")
@@ -1205,4 +1114,25 @@ st.markdown("""
     <h4 style='color: #2d3748; margin-bottom: 1rem;'>Sleep Disorder Prediction</h4>
     <p style='color: #48bb78; font-size: 1.1rem; margin: 0;'>Take care of your sleep health! 😴💤</p>
 </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+SPANS.record_since('rerun', rerun_start)
+METRICS_FILE = os.environ.get('SLEEP_METRICS_FILE')
+if METRICS_FILE:
+    # Metrics are best-effort: a full disk or a bad path must not break the page
+    try:
+        SPANS.write_prometheus(METRICS_FILE, model_version=artifact['key'], cache=prediction_cache.stats(),
+                               batching=prediction_batcher.metrics.snapshot())
+    except OSError as e:
+        logger.warning(f"Could not write metrics to {METRICS_FILE}: {e}")
+
+# Hidden timing breakdown: open the app with ?debug=1 (or set SLEEP_DEBUG=1)
+if os.environ.get('SLEEP_DEBUG') == '1' or st.query_params.get('debug') == '1':
+    with st.expander("⏱️ Debug: timing breakdown"):
+        st.dataframe(pd.DataFrame(SPANS.current_trace(), columns=['Stage', 'Milliseconds']),
+                     use_container_width=True)
+        st.json({'model_version': artifact['key'], 'model_reloads': model_handle.reloads,
+                 'cache': prediction_cache.stats(),
+                 'batching': prediction_batcher.metrics.snapshot()})
+        st.code(SPANS.prometheus_text(model_version=artifact['key'], cache=prediction_cache.stats(),
+                                      batching=prediction_batcher.metrics.snapshot()), language='text')
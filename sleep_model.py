@@ -0,0 +1,602 @@
+import copy
+import hashlib
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from data_cache import compact_dtypes, load_table, table_fingerprint
+from encoding import CategoryEncoder
+from imbalance import DEFAULT_STRATEGY, resample
+from inference import STANDARDIZE_CHUNK_ROWS, CompiledForest, standardize, weigh
+from telemetry import SPANS
+
+# Training data and on-disk model store
+DATA_PATH = 'scoring_sleep.xlsx'
+MODEL_DIR = os.environ.get('SLEEP_MODEL_DIR', 'models')
+
+# Size and seed of the fallback dataset used when the spreadsheet is missing
+SYNTHETIC_SAMPLES = 500
+SYNTHETIC_SEED = 42
+
+# Source values behind the synthetic generator's category codes, matching the
+# spreadsheet's own coding (Academic Level 1-4, BMI Category 1-3 of 1-4)
+SYNTHETIC_CATEGORIES = {
+    'Gender': [0, 1],
+    'Academic Level': [1, 2, 3, 4],
+    'BMI Category': [1, 2, 3],
+}
+
+# Pointer to the most recently written artifact, used by serve-only workers
+LATEST_FILE = 'LATEST'
+
+# Bump when the artifact layout or the training pipeline changes
+ARTIFACT_VERSION = 3
+
+# Feature importance weights based on requirements
+FEATURE_WEIGHTS = {
+    'Stress Level': 4.5,          # Highest importance (50%)
+    'Quality of Sleep': 3.5,      # Second highest (30%)
+    'Physical Activity Level': 2.5, # Third (20%)
+    'Academic Level': 2.0,        # Progressive risk: Level 0=low, Level 3=high (25%)
+    'Sleep Duration': 1.0,        # Fifth (10%)
+    'Systolic BP': 0.5,          # Lower importance (5%)
+    'BMI Category': 0.5,         # Lower importance (5%)
+    'Heart Rate (bpm)': 0.3,     # Lower importance (3%)
+    'Diastolic BP': 0.2,         # Lower importance (2%)
+    'Daily Steps': 0.2,          # Lower importance (2%)
+    'Age': 0.2,                  # Lower importance (2%)
+    'Gender': 0.1                # Lowest importance (1%)
+}
+
+# All model inputs, in training column order
+POTENTIAL_FEATURES = ['Gender', 'Age', 'Academic Level', 'Sleep Duration',
+                      'Quality of Sleep', 'Physical Activity Level', 'Stress Level',
+                      'BMI Category', 'Heart Rate (bpm)', 'Daily Steps', 'Systolic BP',
+                      'Diastolic BP']
+
+# Worker count for forest fitting and batch scoring (-1 = all cores)
+N_JOBS = int(os.environ.get('SLEEP_N_JOBS', '-1'))
+
+# Enhanced Random Forest parameters
+MODEL_PARAMS = {
+    'n_estimators': 200,           # More trees for better performance
+    'max_depth': 15,               # Control overfitting
+    'min_samples_split': 5,        # Prevent overfitting
+    'min_samples_leaf': 2,         # Prevent overfitting
+    'random_state': 42,
+    'class_weight': 'balanced'     # Handle class imbalance
+}
+
+
+# Load data function with all 13 features. Excel sources go through the typed
+# Arrow cache in data_cache, so only the first load of a file pays for openpyxl.
+def load_data(path=DATA_PATH):
+    df, encoder = load_dataset(path)
+    return df
+
+
+# Encoded training frame plus the category schema it was encoded with
+def load_dataset(path=DATA_PATH):
+    with SPANS.span('load_data', path=path):
+        try:
+            df, categories = load_table(path)
+            return df, CategoryEncoder(categories)
+        except FileNotFoundError:
+            # If file not found, create comprehensive sample data with all 13 features
+            return generate_synthetic_data(), CategoryEncoder(SYNTHETIC_CATEGORIES)
+
+
+# Synthetic dataset with all 13 features and rule-based sleep disorder labels.
+# Fully vectorized so it can produce millions of rows for load testing; columns
+# get the same compact dtypes as the Arrow-cached spreadsheet.
+def generate_synthetic_data(n_samples=SYNTHETIC_SAMPLES, seed=SYNTHETIC_SEED):
+    rng = np.random.RandomState(seed)
+
+    data = {
+        'Person ID': np.arange(1, n_samples + 1),
+        'Gender': rng.choice([0, 1], n_samples),  # 0: Female, 1: Male
+        'Age': rng.randint(18, 65, n_samples),
+        'Academic Level': rng.choice([0, 1, 2, 3], n_samples),  # 0-3 for Level 1-4
+        'Sleep Duration': rng.normal(7, 1.5, n_samples).clip(3, 12),
+        'Quality of Sleep': rng.randint(1, 11, n_samples),
+        'Physical Activity Level': rng.randint(15, 120, n_samples),
+        'Stress Level': rng.randint(1, 11, n_samples),
+        'BMI Category': rng.choice([0, 1, 2], n_samples),  # 0: Normal, 1: Overweight, 2: Obese
+        'Heart Rate (bpm)': rng.randint(55, 110, n_samples),
+        'Daily Steps': rng.randint(2000, 15000, n_samples),
+        'Systolic BP': rng.randint(100, 160, n_samples),
+        'Diastolic BP': rng.randint(60, 100, n_samples)
+    }
+    level = data['Academic Level']
+    stress = data['Stress Level']
+    heart_rate = data['Heart Rate (bpm)']
+    systolic = data['Systolic BP']
+
+    # Create sleep disorders with clear academic level risk progression
+    stress_score = stress * 5.0  # Highest weight - 50%
+    sleep_quality_score = (11 - data['Quality of Sleep']) * 3.0  # Second highest - 30%
+    activity_score = np.maximum(0, 60 - data['Physical Activity Level']) * 2.0  # Third - 2
+
+    # Academic level risk increases progressively: Level 0=minimal, Level 3=maximum
+    academic_level_risk = level * 3.0  # 0, 3, 6, 9, 12 progression
+    duration_score = np.abs(8 - data['Sleep Duration']) * 1.0  # Fifth - 10%
+
+    # Other factors have lower weights
+    bp_score = np.maximum(0, systolic - 120) * 0.5  # 5%
+    hr_score = np.maximum(0, heart_rate - 80) * 0.3  # 3%
+    bmi_score = data['BMI Category'] * 0.5  # 5%
+    steps_score = np.maximum(0, 8000 - data['Daily Steps']) * 0.0002  # 2%
+    age_score = np.maximum(0, data['Age'] - 40) * 0.2  # 2%
+    gender_score = data['Gender'] * 0.1  # 1%
+
+    base_risk_score = (stress_score + sleep_quality_score + activity_score +
+                       academic_level_risk + duration_score + bp_score + hr_score +
+                       bmi_score + steps_score + age_score + gender_score)
+
+    # Academic level multiplier: Level 0=0.5x, Level 1=0.8x, Level 2=1.2x, Level 3=1.8x
+    academic_multipliers = np.array([0.5, 0.8, 1.2, 1.8])  # Progressive risk increase
+    total_risk_score = base_risk_score * academic_multipliers[level]
+
+    # Risk thresholds adjusted for academic levels
+    high_risk_threshold = 25 - (level * 3)  # Lower threshold for higher levels
+    medium_risk_threshold = 15 - (level * 2)
+
+    high_risk = (total_risk_score > high_risk_threshold) & (stress >= (7 - level))
+    medium_risk = ~high_risk & (total_risk_score > medium_risk_threshold)
+
+    # One batched draw: at most two uniforms are consumed per row
+    u = rng.random_sample((2, n_samples))
+    first, second = u[0], u[1]
+
+    # High risk - higher academic levels develop disorders with lower stress
+    high_label = np.select(
+        [
+            level >= 3,  # Level 4 (Expert)
+            level == 2,  # Level 3 (Advanced)
+            level == 1,  # Level 2 (Intermediate)
+        ],
+        [
+            np.where(first < 0.9, 'Insomnia', 'Sleep Apnea'),
+            np.where(first < 0.8, 'Insomnia', 'Sleep Apnea'),
+            np.where((heart_rate > 85) | (systolic > 140),
+                     np.where(first < 0.6, 'Sleep Apnea', 'Insomnia'), 'Insomnia'),
+        ],
+        # Level 1 (Basic) - lowest risk, often no disorder
+        default=np.where((stress >= 8) & (heart_rate > 90), 'Sleep Apnea', 'None'),
+    )
+
+    # Medium risk - academic level influences disorder probability
+    disorder_probabilities = np.array([0.1, 0.3, 0.6, 0.8])  # Level 0-3 disorder chances
+    medium_label = np.where(
+        first < disorder_probabilities[level],
+        np.select(
+            [level >= 2, level == 1],  # Advanced levels prefer insomnia, Intermediate - mixed
+            [np.full(n_samples, 'Insomnia'), np.where(second < 0.7, 'Insomnia', 'Sleep Apnea')],
+            default=np.where(second < 0.7, 'None', 'Sleep Apnea'),  # Basic level - mostly none
+        ),
+        'None',
+    )
+
+    # Low risk - but higher academic levels can still develop issues
+    low_risk_probabilities = np.array([0.02, 0.08, 0.15, 0.25])  # Even low risk varies by level
+    low_label = np.where(
+        first < low_risk_probabilities[level],
+        np.select(
+            [(level >= 3) & (stress >= 5), (level >= 2) & (stress >= 6)],
+            [np.full(n_samples, 'Insomnia'), np.where(second < 0.8, 'Insomnia', 'None')],
+            default='None',
+        ),
+        'None',
+    )
+
+    data['Sleep Disorder'] = np.where(high_risk, high_label, np.where(medium_risk, medium_label, low_label))
+
+    return compact_dtypes(pd.DataFrame(data), SYNTHETIC_CATEGORIES)
+
+
+# Weighted float32 model inputs for the feature columns `df` has, and those
+# columns. Square-root weights moderate the effect while preserving importance.
+def weighted_features(df, feature_weights=FEATURE_WEIGHTS):
+    feature_cols = [col for col in POTENTIAL_FEATURES if col in df.columns]
+    X = weigh(df[feature_cols].to_numpy(), np.sqrt([feature_weights.get(col, 1.0) for col in feature_cols]))
+    return X, feature_cols
+
+
+# Resample, standardize and fit on a weighted training matrix: the pipeline
+# shared by train_model and tune.py's folds. Returns (rf_model, scaler).
+# `mark(stage)` is called after each stage. The resampled matrix is scaled in
+# place; X_train itself is never modified.
+def fit_pipeline(X_train, y_train, model_params, imbalance=DEFAULT_STRATEGY, mark=None):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    mark = mark or (lambda stage: None)
+
+    # Handle class imbalance (SMOTE by default)
+    X_train_res, y_train_res = resample(X_train, y_train, imbalance, model_params.get('n_jobs'))
+    mark('resample')
+
+    # Statistics are accumulated in chunks: a single fit() would make a float64
+    # copy of the whole float32 matrix
+    scaler = StandardScaler()
+    for start in range(0, len(X_train_res), STANDARDIZE_CHUNK_ROWS):
+        scaler.partial_fit(X_train_res[start:start + STANDARDIZE_CHUNK_ROWS])
+    X_train_scaled = standardize(X_train_res, scaler.mean_, scaler.scale_,
+                                 out=None if X_train_res is X_train else X_train_res)
+    del X_train_res
+    mark('scale')
+
+    # Train enhanced Random Forest model with optimized parameters
+    rf_model = RandomForestClassifier(**model_params)
+    rf_model.fit(X_train_scaled, y_train_res)
+    mark('fit')
+    return rf_model, scaler
+
+
+# Train model function with weighted features; pass a dict as `timings` to
+# collect per-stage wall-clock seconds. `imbalance` names the resampling
+# strategy (see imbalance.py).
+# Training-only libraries are imported here rather than at module level, so
+# serving workers that only load a stored artifact never pay for them.
+# Memory-lean: the features are copied once into a weighted float32 matrix
+# (the dtype the trees split on anyway), the split is done on row indices and
+# scaling happens in place, with the same arithmetic as serving (see
+# inference.weigh / standardize). X_train / X_test are returned weighted but
+# unscaled.
+def train_model(df, params=None, timings=None, imbalance=DEFAULT_STRATEGY):
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import accuracy_score
+
+    feature_weights = dict(FEATURE_WEIGHTS)
+    model_params = dict(MODEL_PARAMS, n_jobs=N_JOBS)
+    model_params.update(params or {})
+    if timings is None:
+        timings = {}
+    train_start = stage_start = time.perf_counter()
+
+    def mark(stage):
+        nonlocal stage_start
+        now = time.perf_counter()
+        timings[stage] = round(now - stage_start, 4)
+        SPANS.record(f'train.{stage}', now - stage_start)
+        stage_start = now
+
+    # Labels as an object array over the few distinct class names: the rows
+    # share those string objects instead of holding one str each
+    codes, class_names = pd.factorize(df['Sleep Disorder'], sort=True)
+    if (codes < 0).any():
+        raise ValueError("Training data has rows without a Sleep Disorder label")
+    y = np.asarray(class_names, dtype=object)[codes]
+
+    # Apply feature weights to scale the importance (only available columns)
+    X, available_features = weighted_features(df, feature_weights)
+    mark('weight')
+
+    # Train-test split
+    train_index, test_index = train_test_split(np.arange(len(X)), test_size=0.2,
+                                               random_state=42, stratify=y)
+    X_train, X_test = X[train_index], X[test_index]
+    y_train, y_test = y[train_index], y[test_index]
+    del X
+    mark('split')
+
+    # Resample, scale and fit
+    rf_model, scaler = fit_pipeline(X_train, y_train, model_params, imbalance, mark)
+
+    # Make predictions
+    y_pred = rf_model.predict(standardize(X_test, scaler.mean_, scaler.scale_))
+
+    # Calculate accuracy
+    accuracy = accuracy_score(y_test, y_pred)
+
+    # Get feature importance
+    feature_importance = dict(zip(available_features, rf_model.feature_importances_))
+    mark('evaluate')
+    SPANS.record_since('train_model', train_start, rows=len(df))
+
+    return (rf_model, scaler, available_features, accuracy, y_test, y_pred,
+            X_train, X_test, feature_importance, feature_weights)
+
+
+# Dataset fingerprint (content hash + encoded schema) of the training file, or a
+# hash of the generator settings for the fallback data. Cheap after the first
+# load: the fingerprint is stored with the file's Arrow cache entry.
+def data_fingerprint(path=DATA_PATH):
+    if os.path.exists(path):
+        return table_fingerprint(path)
+    digest = hashlib.sha256()
+    digest.update(f'synthetic-v2:seed={SYNTHETIC_SEED}:n_samples={SYNTHETIC_SAMPLES}'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+# Shallow copy of a fitted forest that predicts with `n_jobs` threads; the trees
+# are shared, so this is cheap and leaves the cached serving model untouched
+def with_n_jobs(rf_model, n_jobs):
+    if n_jobs is None or n_jobs == rf_model.n_jobs:
+        return rf_model
+    parallel_model = copy.copy(rf_model)
+    parallel_model.n_jobs = n_jobs
+    return parallel_model
+
+
+# Parameters that only affect how fast the model is built, not the model itself
+RUNTIME_PARAMS = ('n_jobs', 'verbose')
+
+
+# Artifact key: data content + everything that changes the fitted model
+def artifact_key(path=DATA_PATH, params=None, compression=None, imbalance=DEFAULT_STRATEGY):
+    import sklearn
+
+    model_params = dict(MODEL_PARAMS, **(params or {}))
+    for name in RUNTIME_PARAMS:
+        model_params.pop(name, None)
+    spec = {
+        'data': data_fingerprint(path),
+        'params': model_params,
+        'feature_weights': FEATURE_WEIGHTS,
+        'artifact_version': ARTIFACT_VERSION,
+        'sklearn': sklearn.__version__,
+    }
+    if compression is not None:
+        spec['compression'] = compression
+    if imbalance != DEFAULT_STRATEGY:
+        spec['imbalance'] = imbalance
+    encoded = json.dumps(spec, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def _artifact_paths(key, model_dir=MODEL_DIR):
+    base = os.path.join(model_dir, f'sleep_model-{key}')
+    return base + '.joblib', base + '.json'
+
+
+def _forest_path(key, model_dir=MODEL_DIR):
+    return os.path.join(model_dir, f'sleep_model-{key}.forest')
+
+
+def _evaluation_path(key, model_dir=MODEL_DIR):
+    return os.path.join(model_dir, f'sleep_model-{key}.eval.json')
+
+
+# Held-out evaluation summary: per-class report, confusion matrix and labels
+def evaluation_summary(y_test, y_pred, classes):
+    from sklearn.metrics import classification_report, confusion_matrix
+
+    labels = [str(c) for c in classes]
+    y_test, y_pred = np.asarray(y_test).astype(str), np.asarray(y_pred).astype(str)
+    return {
+        'accuracy': float(np.mean(y_test == y_pred)),
+        'n_test': int(len(y_test)),
+        'labels': labels,
+        'classification_report': classification_report(y_test, y_pred, labels=labels, output_dict=True,
+                                                        zero_division=0),
+        'confusion_matrix': confusion_matrix(y_test, y_pred, labels=labels).tolist(),
+    }
+
+
+# The evaluation is stored next to the artifact rather than in it, so serving
+# workers never load it unless someone asks (see load_evaluation)
+def save_evaluation(key, evaluation, model_dir=MODEL_DIR):
+    os.makedirs(model_dir, exist_ok=True)
+    path = _evaluation_path(key, model_dir)
+    with open(path + f'.tmp-{os.getpid()}', 'w') as f:
+        json.dump(evaluation, f, indent=2)
+    os.replace(path + f'.tmp-{os.getpid()}', path)
+
+
+# Stored evaluation for an artifact, or None (e.g. artifacts grown by incremental.py)
+def load_evaluation(key, model_dir=MODEL_DIR):
+    try:
+        with open(_evaluation_path(key, model_dir)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+# Write model + metadata; the .joblib file is renamed into place last so readers
+# never see a half-written artifact and concurrent writers simply overwrite each other.
+# With publish_latest=False the caller publishes it later (e.g. once companion
+# files such as a lookup table are written).
+def save_artifact(key, rf_model, scaler, feature_cols, feature_weights, metrics, encoder, model_dir=MODEL_DIR,
+                  publish_latest=True):
+    os.makedirs(model_dir, exist_ok=True)
+    model_path, meta_path = _artifact_paths(key, model_dir)
+    meta = {
+        'key': key,
+        'artifact_version': ARTIFACT_VERSION,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'feature_cols': list(feature_cols),
+        'feature_weights': dict(feature_weights),
+        'categories': encoder.to_dict(),
+        'metrics': metrics,
+    }
+    tmp_suffix = f'.tmp-{os.getpid()}'
+    with open(meta_path + tmp_suffix, 'w') as f:
+        json.dump(meta, f, indent=2, default=float)
+    os.replace(meta_path + tmp_suffix, meta_path)
+    # Compiled array form of the forest for the low-latency inference path
+    forest_path = _forest_path(key, model_dir)
+    CompiledForest.from_sklearn(rf_model).save(forest_path + tmp_suffix)
+    os.replace(forest_path + tmp_suffix, forest_path)
+    # Uncompressed so the tree arrays can be memory-mapped on load
+    joblib.dump({'model': rf_model, 'scaler': scaler}, model_path + tmp_suffix)
+    os.replace(model_path + tmp_suffix, model_path)
+    if publish_latest:
+        publish(key, model_dir)
+    return model_path
+
+
+# Point LATEST (what serve-only workers load) at a stored artifact
+def publish(key, model_dir=MODEL_DIR):
+    latest_path = os.path.join(model_dir, LATEST_FILE)
+    tmp_path = latest_path + f'.tmp-{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        f.write(key)
+    os.replace(tmp_path, latest_path)
+
+
+# Load a stored artifact, or None if it does not exist
+def load_artifact(key, model_dir=MODEL_DIR, mmap_mode='r'):
+    model_path, meta_path = _artifact_paths(key, model_dir)
+    if not (os.path.exists(model_path) and os.path.exists(meta_path)):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get('artifact_version') != ARTIFACT_VERSION:
+        return None
+    payload = joblib.load(model_path, mmap_mode=mmap_mode)
+    forest_path = _forest_path(key, model_dir)
+    return {
+        'key': key,
+        'forest_path': forest_path if os.path.exists(forest_path) else None,
+        'model': payload['model'],
+        'scaler': payload['scaler'],
+        'feature_cols': meta['feature_cols'],
+        'feature_weights': meta['feature_weights'],
+        'encoder': CategoryEncoder(meta['categories']),
+        'metrics': meta['metrics'],
+    }
+
+
+# Shrink a fitted forest with compress.compress_forest. Trees and depth are
+# selected on one half of the (unscaled) hold-out; returns the forest, the
+# compression report and the other, scaled half for an unbiased evaluation.
+def compress_model(rf_model, scaler, X_test, y_test, tolerance):
+    from compress import compress_forest, split_holdout
+
+    X_test = standardize(X_test, scaler.mean_, scaler.scale_)
+    X_val, X_check, y_val, y_check = split_holdout(X_test, y_test)
+    rf_model, compression_report = compress_forest(rf_model, X_val, y_val, tolerance,
+                                                   X_test=X_check, y_test=y_check)
+    compression_report['test_rows'] = int(len(y_check))
+    return rf_model, compression_report, X_check, y_check
+
+
+# How an artifact was trained: forest parameters, imbalance strategy and
+# compression tolerance (None if uncompressed), so a refit can reproduce it.
+# Artifacts saved before this was recorded fall back to the forest's own
+# parameters and the default strategy.
+def training_config(artifact):
+    metrics = artifact['metrics']
+    if 'training' in metrics:
+        return copy.deepcopy(metrics['training'])
+    rf_params = artifact['model'].get_params()
+    return {
+        'params': {name: rf_params[name] for name in MODEL_PARAMS},
+        'imbalance': DEFAULT_STRATEGY,
+        'compression': metrics.get('compression', {}).get('tolerance'),
+    }
+
+
+# Run the full load -> train -> save pipeline and return the artifact plus a
+# report with per-stage timings and evaluation metrics. With `compression` (an
+# accuracy tolerance) the forest is shrunk by compress.compress_forest before
+# it is saved. publish_latest is passed on to save_artifact.
+def train_and_save(path=DATA_PATH, params=None, model_dir=MODEL_DIR, compression=None,
+                   imbalance=DEFAULT_STRATEGY, publish_latest=True):
+    from sklearn.metrics import accuracy_score
+
+    key = artifact_key(path, params, compression, imbalance)
+    timings = {}
+    start = time.perf_counter()
+    df, encoder = load_dataset(path)
+    timings['load'] = round(time.perf_counter() - start, 4)
+    (rf_model, scaler, feature_cols, accuracy, y_test, y_pred,
+     X_train, X_test, feature_importance, feature_weights) = train_model(df, params, timings, imbalance)
+    # Only the serving bundle outlives this call; the training matrix is not needed
+    del X_train
+    compression_report = None
+    if compression is not None:
+        compress_start = time.perf_counter()
+        # Trees and depth were selected on one half of the hold-out, so only
+        # the other half gives an unbiased accuracy and evaluation
+        rf_model, compression_report, X_test, y_test = compress_model(rf_model, scaler, X_test, y_test,
+                                                                      compression)
+        y_pred = rf_model.predict(X_test)
+        accuracy = accuracy_score(y_test, y_pred)
+        feature_importance = dict(zip(feature_cols, rf_model.feature_importances_))
+        timings['compress'] = round(time.perf_counter() - compress_start, 4)
+    metrics = {
+        'accuracy': float(accuracy),
+        'feature_importance': {col: float(v) for col, v in feature_importance.items()},
+        'classes': [str(c) for c in rf_model.classes_],
+        'n_rows': int(len(df)),
+        'train_seconds': round(time.perf_counter() - start, 3),
+        'training': {
+            'params': {name: value for name, value in dict(MODEL_PARAMS, **(params or {})).items()
+                       if name != 'n_jobs'},
+            'imbalance': imbalance,
+            'compression': compression,
+        },
+    }
+    if compression_report is not None:
+        metrics['compression'] = {name: value for name, value in compression_report.items() if name != 'steps'}
+        metrics['compression']['steps'] = [{name: value for name, value in step.items() if name != 'subset_curve'}
+                                           for step in compression_report['steps']]
+    # Training parallelism is not a serving setting; single-row predictions are
+    # slower with a thread pool
+    rf_model.set_params(n_jobs=None)
+    evaluation = evaluation_summary(y_test, y_pred, rf_model.classes_)
+    del X_test, y_test, y_pred
+    save_start = time.perf_counter()
+    save_evaluation(key, evaluation, model_dir)
+    save_artifact(key, rf_model, scaler, feature_cols, feature_weights, metrics, encoder, model_dir,
+                  publish_latest)
+    timings['save'] = round(time.perf_counter() - save_start, 4)
+    report = {
+        'key': key,
+        'data': path,
+        'params': dict(MODEL_PARAMS, **(params or {})),
+        'imbalance': imbalance,
+        'timings': timings,
+        'metrics': metrics,
+        'classification_report': evaluation['classification_report'],
+    }
+    if compression_report is not None:
+        report['compression'] = compression_report
+    artifact = {
+        'key': key,
+        'forest_path': _forest_path(key, model_dir),
+        'model': rf_model,
+        'scaler': scaler,
+        'feature_cols': feature_cols,
+        'feature_weights': feature_weights,
+        'encoder': encoder,
+        'metrics': metrics,
+    }
+    return artifact, report
+
+
+# Serving entry point: reuse the stored model for this data/params, training only on a miss
+def load_or_train_model(path=DATA_PATH, params=None, model_dir=MODEL_DIR):
+    key = artifact_key(path, params)
+    artifact = load_artifact(key, model_dir)
+    if artifact is not None:
+        return artifact
+    artifact, report = train_and_save(path, params, model_dir)
+    return artifact
+
+
+# Key of the most recently published artifact, or None if nothing was published
+def latest_key(model_dir=MODEL_DIR):
+    try:
+        with open(os.path.join(model_dir, LATEST_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+# Serve-only entry point: load whatever `train.py` published last, never train
+def load_latest_artifact(model_dir=MODEL_DIR):
+    key = latest_key(model_dir)
+    if key is None:
+        raise FileNotFoundError(f"No trained model in '{model_dir}'. Run `python train.py` first.")
+    artifact = load_artifact(key, model_dir)
+    if artifact is None:
+        raise FileNotFoundError(f"Model artifact {key} listed in "
+                                f"'{os.path.join(model_dir, LATEST_FILE)}' is missing or outdated.")
+    return artifact
@@ -0,0 +1,132 @@
+# Low-overhead timing spans, structured logs and a Prometheus text dump
+#
+#   with SPANS.span('predict.model'):
+#       ...
+#   start = time.perf_counter(); ...; SPANS.record_since('render.css', start)
+#
+# Every span lands in a fixed-bucket latency histogram (a lock, a bisect and
+# three additions). When a trace is active on the current thread (one per
+# Streamlit rerun) the span is also appended to it for the debug panel, and
+# with SLEEP_LOG_LEVEL=INFO each span is logged as one JSON line.
+import bisect
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+# Histogram upper bounds in seconds (+Inf is implicit)
+SPAN_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+logger = logging.getLogger('sleep_disorder')
+
+LOG_LEVEL = os.environ.get('SLEEP_LOG_LEVEL')
+if LOG_LEVEL and not logger.handlers:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(LOG_LEVEL.upper())
+
+
+# Structured log line: {"event": ..., **fields}
+def log_event(event, **fields):
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(dict(event=event, ts=round(time.time(), 3), **fields), default=str))
+
+
+class SpanRegistry:
+    def __init__(self, buckets=SPAN_BUCKETS):
+        self.buckets = list(buckets)
+        self._lock = threading.Lock()
+        self._histograms = {}    # name -> [bucket counts..., +Inf count, sum]
+        self._local = threading.local()
+
+    def record(self, name, seconds, **fields):
+        slot = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = [0] * (len(self.buckets) + 1) + [0.0]
+            histogram[slot] += 1
+            histogram[-1] += seconds
+        trace = getattr(self._local, 'trace', None)
+        if trace is not None:
+            trace.append((name, seconds * 1000))
+        log_event('span', span=name, ms=round(seconds * 1000, 3), **fields)
+
+    def record_since(self, name, start, **fields):
+        self.record(name, time.perf_counter() - start, **fields)
+
+    @contextlib.contextmanager
+    def span(self, name, **fields):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, **fields)
+
+    # Collect this thread's spans from now on; returns the (name, ms) list
+    def start_trace(self):
+        self._local.trace = []
+        return self._local.trace
+
+    def current_trace(self):
+        return list(getattr(self._local, 'trace', None) or [])
+
+    def snapshot(self):
+        with self._lock:
+            return {name: list(histogram) for name, histogram in self._histograms.items()}
+
+    # Prometheus text exposition format. `cache` and `batching` take
+    # PredictionCache.stats() and BatchMetrics.snapshot() dicts.
+    def prometheus_text(self, model_version=None, cache=None, batching=None):
+        lines = [
+            '# HELP sleep_span_seconds Duration of instrumented stages.',
+            '# TYPE sleep_span_seconds histogram',
+        ]
+        for name, histogram in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ['+Inf'], histogram[:-1]):
+                cumulative += count
+                lines.append(f'sleep_span_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'sleep_span_seconds_sum{{span="{name}"}} {histogram[-1]:.6f}')
+            lines.append(f'sleep_span_seconds_count{{span="{name}"}} {cumulative}')
+        if model_version is not None:
+            lines += [
+                '# HELP sleep_model_info Model artifact currently served.',
+                '# TYPE sleep_model_info gauge',
+                f'sleep_model_info{{version="{model_version}"}} 1',
+            ]
+        if cache is not None:
+            lines += ['# TYPE sleep_prediction_cache_hit_ratio gauge',
+                      f"sleep_prediction_cache_hit_ratio {cache['hit_rate']:.6f}",
+                      '# TYPE sleep_prediction_cache_entries gauge',
+                      f"sleep_prediction_cache_entries {cache['size']}"]
+            for counter in ('hits', 'misses', 'evictions', 'expirations', 'invalidations'):
+                lines += [f'# TYPE sleep_prediction_cache_{counter}_total counter',
+                          f'sleep_prediction_cache_{counter}_total {cache[counter]}']
+        if batching is not None:
+            for counter in ('batches', 'requests', 'rows', 'errors'):
+                lines += [f'# TYPE sleep_batcher_{counter}_total counter',
+                          f'sleep_batcher_{counter}_total {batching[counter]}']
+        return '\n'.join(lines) + '\n'
+
+    # Write the dump atomically, e.g. for node_exporter's textfile collector.
+    # The temp name is per thread: concurrent Streamlit reruns each write their
+    # own file, and the last rename wins.
+    def write_prometheus(self, path, **kwargs):
+        tmp_path = f'{path}.tmp-{os.getpid()}-{threading.get_ident()}'
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(self.prometheus_text(**kwargs))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+# Process-wide registry
+SPANS = SpanRegistry()
@@ -0,0 +1,64 @@
+# Dataset fingerprint and artifact key: stable while the data is unchanged,
+# invalidated by any content edit. Works on a temporary copy of the training
+# spreadsheet with its own data cache.
+import os
+import shutil
+
+import openpyxl
+import pytest
+
+import data_cache
+from sleep_model import DATA_PATH, artifact_key, data_fingerprint
+
+SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), DATA_PATH)
+
+pytestmark = pytest.mark.skipif(not os.path.exists(SOURCE), reason="training spreadsheet not present")
+
+
+# Copy of the spreadsheet in a temporary working directory, so the default
+# (relative) data cache directory is private to the test
+@pytest.fixture
+def spreadsheet(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    shutil.copy(SOURCE, tmp_path / DATA_PATH)
+    return DATA_PATH
+
+
+def test_fingerprint_stable_across_reloads(spreadsheet):
+    fingerprint, key = data_fingerprint(spreadsheet), artifact_key(spreadsheet)
+    df, _ = data_cache.load_table(spreadsheet)
+    df_again, _ = data_cache.load_table(spreadsheet)
+    assert df.equals(df_again)
+    assert data_fingerprint(spreadsheet) == fingerprint
+    assert artifact_key(spreadsheet) == key
+
+
+def test_mtime_only_touch_keeps_fingerprint(spreadsheet, monkeypatch):
+    fingerprint, key = data_fingerprint(spreadsheet), artifact_key(spreadsheet)
+    stat = os.stat(spreadsheet)
+    os.utime(spreadsheet, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    # Same content: the cache entry is revalidated by hash, not rebuilt
+    def fail_build(*args, **kwargs):
+        raise AssertionError("cache rebuilt for an unchanged file")
+
+    monkeypatch.setattr(data_cache, '_build', fail_build)
+    assert data_fingerprint(spreadsheet) == fingerprint
+    assert artifact_key(spreadsheet) == key
+
+
+def test_cell_edit_changes_fingerprint(spreadsheet):
+    fingerprint, key = data_fingerprint(spreadsheet), artifact_key(spreadsheet)
+    df, _ = data_cache.load_table(spreadsheet)
+
+    workbook = openpyxl.load_workbook(spreadsheet)
+    sheet = workbook.active
+    header = [cell.value for cell in sheet[1]]
+    cell = sheet.cell(row=2, column=header.index('Age') + 1)
+    cell.value += 1
+    workbook.save(spreadsheet)
+
+    assert data_fingerprint(spreadsheet) != fingerprint
+    assert artifact_key(spreadsheet) != key
+    edited, _ = data_cache.load_table(spreadsheet)
+    assert edited['Age'].iloc[0] == df['Age'].iloc[0] + 1
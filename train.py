@@ -0,0 +1,94 @@
+# Offline training entry point: fits the model without starting the Streamlit app
+#
+#   python train.py                      # train on scoring_sleep.xlsx with all cores
+#   python train.py --n-jobs 4 --force   # retrain even if an artifact already exists
+#   python train.py --params '{"n_estimators": 100, "max_depth": 10}'   # e.g. from tune.py
+#   python train.py --compress 0.01      # shrink the forest within a 0.01 accuracy tolerance
+#   python train.py --imbalance smote_blocked   # faster resampling for large datasets
+#
+# The app picks the result up from the model store; run it with
+# SLEEP_SERVE_ONLY=1 to make workers load the published model and never train.
+import argparse
+import json
+import os
+import sys
+
+from sleep_model import DATA_PATH, MODEL_DIR, N_JOBS, artifact_key, load_artifact, publish, train_and_save
+from imbalance import DEFAULT_STRATEGY, IMBALANCE_STRATEGIES
+from inference import FastPredictor
+from lookup_table import LookupTable, lookup_table_built, lookup_table_path, unusable_reasons
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the sleep disorder model and publish it to the model store.")
+    parser.add_argument('--data', default=DATA_PATH, help="Training spreadsheet (synthetic data is used if missing)")
+    parser.add_argument('--model-dir', default=MODEL_DIR, help="Artifact store directory")
+    parser.add_argument('--n-jobs', type=int, default=N_JOBS,
+                        help="Cores for the RandomForest fit (-1 = all, default: $SLEEP_N_JOBS or -1)")
+    parser.add_argument('--params', type=json.loads, default={},
+                        help="JSON object of RandomForest parameters overriding MODEL_PARAMS")
+    parser.add_argument('--compress', type=float, default=None, metavar='TOLERANCE',
+                        help="Compress the forest (tree subset, depth cap, leaf merging) within this "
+                             "held-out accuracy tolerance; see compress.py")
+    parser.add_argument('--imbalance', choices=IMBALANCE_STRATEGIES, default=DEFAULT_STRATEGY,
+                        help="Class-imbalance strategy (default: %(default)s); see imbalance.py")
+    parser.add_argument('--report', default=None, help="Where to write the timing/metrics report (JSON)")
+    parser.add_argument('--force', action='store_true', help="Retrain even if a matching artifact exists")
+    parser.add_argument('--lookup-table', action='store_true',
+                        help="Also precompute the probability lookup table for the form's input grid "
+                             "(served only if it passes its accuracy bounds; see lookup_table.py)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    params = dict(args.params, n_jobs=args.n_jobs)
+
+    key = artifact_key(args.data, params, args.compress, args.imbalance)
+    artifact = None if args.force else load_artifact(key, args.model_dir)
+    if artifact is not None:
+        if args.lookup_table and not lookup_table_built(key, args.model_dir):
+            build_lookup_table(artifact, args.model_dir)
+        # Still the model to serve, even if another configuration was published since
+        publish(key, args.model_dir)
+        print(f"Model {key} is already up to date in '{args.model_dir}'; published it as the latest model "
+              f"(use --force to retrain)")
+        return 0
+
+    # With a lookup table, publish only once it is written: a worker that swaps
+    # in the new model looks for its table at that moment
+    artifact, report = train_and_save(args.data, params, args.model_dir, args.compress, args.imbalance,
+                                      publish_latest=not args.lookup_table)
+
+    report_path = args.report or os.path.join(args.model_dir, f'train_report-{key}.json')
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2, default=float)
+
+    print(f"Trained model {key} on {report['metrics']['n_rows']} rows")
+    for stage, seconds in report['timings'].items():
+        print(f"  {stage:<9} {seconds:8.3f}s")
+    print(f"Accuracy: {report['metrics']['accuracy']:.4f}")
+    if 'compression' in report:
+        steps = report['compression']['steps']
+        print(f"Compressed {steps[0]['n_trees']} -> {steps[-1]['n_trees']} trees, "
+              f"{steps[0]['n_nodes']} -> {steps[-1]['n_nodes']} nodes, "
+              f"{steps[0]['latency_ms']:.3f} -> {steps[-1]['latency_ms']:.3f} ms per row")
+    print(f"Report written to {report_path}")
+
+    if args.lookup_table:
+        build_lookup_table(artifact, args.model_dir)
+        publish(key, args.model_dir)
+    return 0
+
+
+def build_lookup_table(artifact, model_dir):
+    lookup = LookupTable.build(FastPredictor.from_artifact(artifact), artifact['key'])
+    lookup.save(lookup_table_path(artifact['key'], model_dir))
+    print(f"Lookup table: mean abs error {lookup.accuracy['mean_abs_error']:.4f}, "
+          f"label agreement {lookup.accuracy['label_agreement']:.2%}")
+    if not lookup.usable:
+        print(f"Lookup table will not be used: {'; '.join(unusable_reasons(lookup.accuracy))}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
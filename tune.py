@@ -0,0 +1,264 @@
+# Cross-validated model selection: RandomForest parameter search with an
+# accuracy / latency / size Pareto report
+#
+#   python tune.py                         # full grid, 5 stratified folds, all cores
+#   python tune.py --random 20 --folds 3   # 20 random grid points
+#   python tune.py --min-accuracy 0.75     # also recommend the cheapest model above 0.75
+#   python tune.py --imbalance undersample # tune for another class-imbalance strategy
+#
+# Each fold runs train.py's pipeline (sleep_model.fit_pipeline: float32
+# weighting, resampling, scaling, fit) on its own training part only, so
+# validation rows never leak into training. Folds run in parallel
+# (N_JOBS workers, one single-threaded forest each) and every finished fold is
+# written to the cache directory, so an interrupted or extended search only
+# fits what is missing.
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from joblib import Parallel, delayed
+
+from sleep_model import (DATA_PATH, FEATURE_WEIGHTS, MODEL_DIR, MODEL_PARAMS, N_JOBS, data_fingerprint,
+                         fit_pipeline, load_data, weighted_features)
+from imbalance import DEFAULT_STRATEGY, IMBALANCE_STRATEGIES
+from inference import standardize
+
+PARAM_GRID = {
+    'n_estimators': [25, 50, 100, 200],
+    'max_depth': [6, 10, 15, None],
+    'min_samples_split': [2, 5],
+    'min_samples_leaf': [1, 2, 4],
+}
+
+N_FOLDS = 5
+CV_SEED = 42
+
+# Bump when fold evaluation changes, so cached results are not reused
+TUNE_VERSION = 2
+
+# Single-row calls timed per candidate
+LATENCY_CALLS = 200
+
+
+def candidate_params(grid=PARAM_GRID, n_random=None, seed=0):
+    names = sorted(grid)
+    combos = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    if n_random is not None and n_random < len(combos):
+        rng = np.random.RandomState(seed)
+        combos = [combos[i] for i in sorted(rng.choice(len(combos), n_random, replace=False))]
+    current = {name: MODEL_PARAMS[name] for name in names}
+    if current not in combos:
+        combos.insert(0, current)
+    return combos
+
+
+def _cache_path(cache_dir, spec):
+    name = hashlib.sha256(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, name + '.json')
+
+
+def _read_cached(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cached(path, result):
+    tmp_path = path + f'.tmp-{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        json.dump(result, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _fit(X, y, params, imbalance):
+    model_params = dict(MODEL_PARAMS, n_jobs=1)
+    model_params.update(params)
+    return fit_pipeline(X, y, model_params, imbalance)
+
+
+# Fit and score one (params, fold) pair; the result is cached by the worker itself
+def run_fold(X, y, params, fold, train_index, test_index, cache_path, imbalance=DEFAULT_STRATEGY):
+    from sklearn.metrics import accuracy_score, f1_score
+
+    start = time.perf_counter()
+    rf_model, scaler = _fit(X[train_index], y[train_index], params, imbalance)
+    fit_seconds = time.perf_counter() - start
+    y_pred = rf_model.predict(standardize(X[test_index], scaler.mean_, scaler.scale_))
+    result = {
+        'params': params,
+        'fold': fold,
+        'accuracy': float(accuracy_score(y[test_index], y_pred)),
+        'macro_f1': float(f1_score(y[test_index], y_pred, average='macro')),
+        'fit_seconds': fit_seconds,
+        'n_nodes': int(sum(tree.tree_.node_count for tree in rf_model.estimators_)),
+    }
+    _write_cached(cache_path, result)
+    return result
+
+
+# Inference cost of a candidate fitted on all rows: single-row latency through
+# the serving predictor and the compiled forest's size
+def profile_candidate(X, y, params, feature_cols, cache_path, imbalance=DEFAULT_STRATEGY):
+    from inference import CompiledForest, FastPredictor
+
+    rf_model, scaler = _fit(X, y, params, imbalance)
+    forest = CompiledForest.from_sklearn(rf_model)
+    weights = {col: FEATURE_WEIGHTS.get(col, 1.0) for col in feature_cols}
+    predictor = FastPredictor(rf_model, scaler, feature_cols, weights, forest)
+    row = X[:1] / np.sqrt([weights[col] for col in feature_cols])
+    predictor.predict_proba(row)
+    samples = []
+    for _ in range(LATENCY_CALLS):
+        start = time.perf_counter()
+        predictor.predict_proba(row)
+        samples.append(time.perf_counter() - start)
+    result = {
+        'params': params,
+        'latency_ms': float(np.median(samples) * 1000),
+        'n_nodes': int(len(forest.threshold)),
+        'size_kb': sum(getattr(forest, name).nbytes for name in CompiledForest.ARRAYS) / 1024,
+    }
+    _write_cached(cache_path, result)
+    return result
+
+
+# Indices of candidates no other candidate beats on every objective
+# (higher accuracy, lower latency, smaller size)
+def pareto_front(candidates):
+    front = []
+    for i, a in enumerate(candidates):
+        dominated = any(
+            b['accuracy'] >= a['accuracy'] and b['latency_ms'] <= a['latency_ms'] and b['size_kb'] <= a['size_kb']
+            and (b['accuracy'] > a['accuracy'] or b['latency_ms'] < a['latency_ms'] or b['size_kb'] < a['size_kb'])
+            for j, b in enumerate(candidates) if j != i)
+        if not dominated:
+            front.append(i)
+    return front
+
+
+def search(df, candidates, data_id, n_folds=N_FOLDS, n_jobs=N_JOBS, cache_dir=None, imbalance=DEFAULT_STRATEGY):
+    from sklearn.model_selection import StratifiedKFold
+
+    cache_dir = cache_dir or os.path.join(MODEL_DIR, 'tuning')
+    os.makedirs(cache_dir, exist_ok=True)
+    X, feature_cols = weighted_features(df)
+    y = df['Sleep Disorder'].astype(str).to_numpy()
+    folds = list(StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=CV_SEED).split(X, y))
+
+    def spec(params, kind, fold=None):
+        return {'tune': TUNE_VERSION, 'data': data_id, 'params': params, 'kind': kind,
+                'folds': n_folds, 'seed': CV_SEED, 'fold': fold, 'imbalance': imbalance,
+                'feature_weights': FEATURE_WEIGHTS}
+
+    fold_results, pending = [], []
+    for params in candidates:
+        for fold, (train_index, test_index) in enumerate(folds):
+            path = _cache_path(cache_dir, spec(params, 'fold', fold))
+            cached = _read_cached(path)
+            if cached is not None:
+                fold_results.append(cached)
+            else:
+                pending.append(delayed(run_fold)(X, y, params, fold, train_index, test_index, path, imbalance))
+    n_cached = len(fold_results)
+    if pending:
+        fold_results += Parallel(n_jobs=n_jobs)(pending)
+
+    # Latency is timed one candidate at a time so parallel fits don't skew it
+    profiles = []
+    for params in candidates:
+        path = _cache_path(cache_dir, spec(params, 'profile'))
+        profiles.append(_read_cached(path) or profile_candidate(X, y, params, feature_cols, path, imbalance))
+
+    results = []
+    for params, profile in zip(candidates, profiles):
+        scores = [r for r in fold_results if r['params'] == params]
+        accuracy = np.array([r['accuracy'] for r in scores])
+        results.append({
+            'params': params,
+            'accuracy': float(accuracy.mean()),
+            'accuracy_std': float(accuracy.std()),
+            'macro_f1': float(np.mean([r['macro_f1'] for r in scores])),
+            'fit_seconds': float(np.mean([r['fit_seconds'] for r in scores])),
+            'latency_ms': profile['latency_ms'],
+            'n_nodes': profile['n_nodes'],
+            'size_kb': profile['size_kb'],
+        })
+    for i in pareto_front(results):
+        results[i]['pareto'] = True
+    return results, {'folds_run': len(pending), 'folds_cached': n_cached}
+
+
+# Cheapest Pareto-optimal candidate (latency, then size) meeting the accuracy bar
+def recommend(results, min_accuracy):
+    eligible = [r for r in results if r.get('pareto') and r['accuracy'] >= min_accuracy]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda r: (r['latency_ms'], r['size_kb']))
+
+
+def format_params(params):
+    return ' '.join(f"{name}={params[name]}" for name in sorted(params))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cross-validated RandomForest parameter search.")
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--folds', type=int, default=N_FOLDS)
+    parser.add_argument('--random', type=int, default=None, metavar='N',
+                        help="Evaluate N random grid points instead of the full grid")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for --random")
+    parser.add_argument('--n-jobs', type=int, default=N_JOBS,
+                        help="Parallel fold fits (-1 = all cores, default: $SLEEP_N_JOBS or -1)")
+    parser.add_argument('--min-accuracy', type=float, default=None,
+                        help="Recommend the cheapest Pareto-optimal model with at least this CV accuracy")
+    parser.add_argument('--imbalance', choices=IMBALANCE_STRATEGIES, default=DEFAULT_STRATEGY,
+                        help="Class-imbalance strategy of the fitted pipeline (default: %(default)s)")
+    parser.add_argument('--cache-dir', default=os.path.join(MODEL_DIR, 'tuning'))
+    parser.add_argument('--report', default=None, help="Where to write the JSON report")
+    args = parser.parse_args(argv)
+
+    candidates = candidate_params(PARAM_GRID, args.random, args.seed)
+    data_id = data_fingerprint(args.data)
+    start = time.perf_counter()
+    results, counts = search(load_data(args.data), candidates, data_id, args.folds, args.n_jobs, args.cache_dir,
+                             args.imbalance)
+    elapsed = time.perf_counter() - start
+
+    current = {name: MODEL_PARAMS[name] for name in PARAM_GRID}
+    print(f"{len(candidates)} candidates x {args.folds} folds: {counts['folds_run']} fitted, "
+          f"{counts['folds_cached']} from cache, {elapsed:.1f}s")
+    print(f"{'':2}{'cv acc':>8} {'std':>6} {'f1':>6} {'lat ms':>7} {'size KB':>8} {'nodes':>7}  params")
+    for r in sorted(results, key=lambda r: -r['accuracy']):
+        mark = ('*' if r.get('pareto') else ' ') + ('c' if r['params'] == current else ' ')
+        print(f"{mark}{r['accuracy']:>8.4f} {r['accuracy_std']:>6.3f} {r['macro_f1']:>6.3f} "
+              f"{r['latency_ms']:>7.3f} {r['size_kb']:>8.0f} {r['n_nodes']:>7}  {format_params(r['params'])}")
+    print("* Pareto-optimal (accuracy / latency / size), c current MODEL_PARAMS")
+
+    choice = None
+    if args.min_accuracy is not None:
+        choice = recommend(results, args.min_accuracy)
+        if choice is None:
+            print(f"No candidate reaches accuracy {args.min_accuracy}")
+        else:
+            print(f"Cheapest model with accuracy >= {args.min_accuracy}: {format_params(choice['params'])}")
+            imbalance = '' if args.imbalance == DEFAULT_STRATEGY else f' --imbalance {args.imbalance}'
+            print(f"  python train.py --params '{json.dumps(choice['params'])}'{imbalance}")
+
+    report_path = args.report or os.path.join(MODEL_DIR, f'tune_report-{data_id[:16]}.json')
+    with open(report_path, 'w') as f:
+        json.dump({'data': args.data, 'folds': args.folds, 'grid': PARAM_GRID, 'imbalance': args.imbalance,
+                   'results': results,
+                   'min_accuracy': args.min_accuracy, 'recommended': choice}, f, indent=2)
+    print(f"Report written to {report_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())